@@ -2,6 +2,7 @@ import json, collections
 import matplotlib.pyplot as plt
 import itertools, string, pandas as pd
 import numpy as np, os
+from generation_stream import read_generation_evolutions, is_output
 
 TRAITS = {str(list(a)):b for a, b in zip(itertools.product(*[[0, 1] for _ in range(4)]), string.ascii_uppercase)}
 
@@ -125,10 +126,9 @@ def compute_avg(d:dict) -> None:
 def actor_decisions(folder:str) -> None:
     merged_results = {}
     for f_name in os.listdir(folder):
-        if f_name.startswith('generation_evolutions'):
-            with open(os.path.join(folder, f_name)) as f:
-                data = json.load(f)['actor_decision_evolutions']
-                merge_vals(merged_results, data)
+        if is_output(f_name, 'generation_evolutions'):
+            data = read_generation_evolutions(os.path.join(folder, f_name))['actor_decision_evolutions']
+            merge_vals(merged_results, data)
 
     
     compute_avg(merged_results)
@@ -2,10 +2,12 @@ import random, typing, json, copy
 import collections, networkx as nx
 from networkx.drawing.nx_agraph import write_dot, graphviz_layout
 import matplotlib.pyplot as plt, itertools
-import functools
+import functools, hashlib, numpy as np
+from array import array
 
 class node:
     class Input:
+        __slots__ = ('_type', 'name', 'value')
         def __init__(self, _type:typing.Type, name:typing.Union[str, int], value:typing.Any = None) -> None:
             self._type = _type
             self.name = name
@@ -24,6 +26,7 @@ class node:
             return f'node.{self.__class__.__name__}({self._type.__name__}, {self.name})'
 
     class Constant:
+        __slots__ = ('_type', 'name', 'value')
         def __init__(self, _type:typing.Type, name:typing.Union[str, int], value:typing.Any = None) -> None:
             self._type = _type
             self.name = name
@@ -42,6 +45,7 @@ class node:
             return f'node.{self.__class__.__name__}({self._type.__name__}, {self.name})'
 
     class Output:
+        __slots__ = ('_type', 'name', 'input', 'value')
         def __init__(self, _type:typing.Type, name:typing.Union[int, float], _input:int) -> None:
             self._type = _type
             self.name = name
@@ -63,6 +67,7 @@ class node:
     class operator:
         class NAND:
             INPUT_NUM = 2
+            __slots__ = ('name', 'inputs', 'parents', 'layer')
             def __init__(self, name:typing.Union[str, int], inputs:typing.List = []) -> None:
                 self.name = name
                 self.inputs = inputs
@@ -73,11 +78,16 @@ class node:
                 assert len(inputs) == len(self.inputs)
                 return not all(inputs)
         
+            def bitwise(self, mask:int, *words:int) -> int:
+                assert len(words) == len(self.inputs)
+                return mask ^ functools.reduce(int.__and__, words, mask)
+
             def __repr__(self) -> str:
                 return f'node.operator.{self.__class__.__name__}({self.name}, inputs={self.inputs}, parents={self.parents})'
 
         class OR:
             INPUT_NUM = 2
+            __slots__ = ('name', 'inputs', 'parents', 'layer')
             def __init__(self, name:typing.Union[str, int], inputs:typing.List = []) -> None:
                 self.name = name
                 self.inputs = inputs
@@ -88,11 +98,16 @@ class node:
                 assert len(inputs) == len(self.inputs)
                 return any(inputs)
         
+            def bitwise(self, mask:int, *words:int) -> int:
+                assert len(words) == len(self.inputs)
+                return functools.reduce(int.__or__, words, 0)
+
             def __repr__(self) -> str:
                 return f'node.operator.{self.__class__.__name__}({self.name}, inputs={self.inputs}, parents={self.parents})'
 
         class AND:
             INPUT_NUM = 2
+            __slots__ = ('name', 'inputs', 'parents', 'layer')
             def __init__(self, name:typing.Union[str, int], inputs:typing.List = []) -> None:
                 self.name = name
                 self.inputs = inputs
@@ -103,11 +118,16 @@ class node:
                 assert len(inputs) == len(self.inputs)
                 return all(inputs)
         
+            def bitwise(self, mask:int, *words:int) -> int:
+                assert len(words) == len(self.inputs)
+                return functools.reduce(int.__and__, words, mask)
+
             def __repr__(self) -> str:
                 return f'node.operator.{self.__class__.__name__}({self.name}, inputs={self.inputs}, parents={self.parents})'
 
         class NOR:
             INPUT_NUM = 2
+            __slots__ = ('name', 'inputs', 'parents', 'layer')
             def __init__(self, name:typing.Union[str, int], inputs:typing.List = []) -> None:
                 self.name = name
                 self.inputs = inputs
@@ -118,12 +138,17 @@ class node:
                 assert len(inputs) == len(self.inputs)
                 return not any(inputs)
         
+            def bitwise(self, mask:int, *words:int) -> int:
+                assert len(words) == len(self.inputs)
+                return mask ^ functools.reduce(int.__or__, words, 0)
+
             def __repr__(self) -> str:
                 return f'node.operator.{self.__class__.__name__}({self.name}, inputs={self.inputs}, parents={self.parents})'
 
 
         class NOT:
             INPUT_NUM = 1
+            __slots__ = ('name', 'inputs', 'parents', 'layer')
             def __init__(self, name:typing.Union[str, int], inputs:typing.List = []) -> None:
                 self.name = name
                 self.inputs = inputs
@@ -134,16 +159,36 @@ class node:
                 assert len(inputs) == len(self.inputs)
                 return not self.inputs[0]
         
+            def bitwise(self, mask:int, *words:int) -> int:
+                assert len(words) == len(self.inputs)
+                return 0 if self.inputs[0] else mask
+
             def __repr__(self) -> str:
                 return f'node.operator.{self.__class__.__name__}({self.name}, inputs={self.inputs}, parents={self.parents})'
 
+@functools.lru_cache(maxsize = None)
+def INPUT_WORDS(inputs:int) -> typing.Tuple[int]:
+    '''
+    bit k of the j-th word is the value of input j in the k-th vector of itertools.product([0, 1], repeat = inputs)
+    '''
+    return tuple(sum(1 << k for k in range(2**inputs) if k >> (inputs - 1 - j) & 1) for j in range(inputs))
+
+def majority_decisions(tables:typing.List[int], inputs:int) -> typing.Tuple[bool]:
+    '''majority vote of the output words (see Genotype.evaluate_words) for each input vector, ties go to the first output'''
+    decisions = []
+    for ind in range(2**inputs):
+        votes = sum(i >> ind & 1 for i in tables)
+        decisions.append(votes*2 > len(tables) or (votes*2 == len(tables) and bool(tables[0] >> ind & 1)))
+
+    return tuple(decisions)
+
 def VALIDATE_GENOTYPE(max_attempts = 5) -> typing.Callable:
     def main_wrapper(_f:typing.Callable):
         @functools.wraps(_f)
-        def random_genotype(cls, *args:typing.Tuple[int]) -> 'Genotype':
-            r_genotype, counter = _f(cls, *args), -1
+        def random_genotype(cls, *args:typing.Tuple[int], **kwargs:dict) -> 'Genotype':
+            r_genotype, counter = _f(cls, *args, **kwargs), -1
             while any(all(i.name not in j.inputs for j in r_genotype.kwargs['gates']) for i in r_genotype.kwargs['inputs']) and (counter:=counter + 1) < max_attempts:
-                r_genotype = _f(cls, *args)
+                r_genotype = _f(cls, *args, **kwargs)
             
             return r_genotype
         
@@ -156,6 +201,12 @@ class Genotype:
         self.kwargs = kwargs
         self.gate_bindings = {j.name:j for j in kwargs['gates']}
         self.value_bindings = None    
+        self._compiled = None
+        self._plan = None
+        self._journal = None
+        self._refs = None
+        self._complexity = None
+        self._fingerprint = None
 
     @property
     def levels_back(self) -> int:
@@ -184,14 +235,229 @@ class Genotype:
         for i in self.kwargs['inputs']:
             i.value = None
 
+    def invalidate(self, complexity:bool = False) -> None:
+        '''
+        drops the caches derived from the wiring
+            - the reference counts behind complexity are kept up to date by set_input, add_input and add_gate
+            - pass complexity = True after editing gates or outputs directly
+        '''
+        self._compiled = None
+        self._plan = None
+        self._fingerprint = None
+        if complexity:
+            self._refs = None
+            self._complexity = None
+
+    @property
+    def plan(self) -> dict:
+        '''
+        evaluation schedule shared by traverse, render, complexity and parents_and_levels
+            - 'order': every reachable gate, sorted by level (ties keep the order of kwargs['gates'])
+            - 'levels': level -> node names, inputs and constants on level 1
+            - 'node_levels': node name -> level
+            - 'parents': gate name -> set of all ancestor nodes
+            - 'active': every node in the cone of the outputs
+            - 'active_order': the gates of 'order' that are in 'active'
+        the plan is rebuilt lazily after a mutation changes the wiring
+        '''
+        if self._plan is None:
+            self._plan = self.build_plan()
+
+        return self._plan
+
+    def build_plan(self) -> dict:
+        node_levels = {i.name:1 for i in self.kwargs['inputs'] + self.kwargs['constants']}
+        levels = collections.defaultdict(list, {1:[*node_levels]})
+        parents, consumers, pending = collections.defaultdict(set), collections.defaultdict(list), {}
+        for x, gate in enumerate(self.kwargs['gates']):
+            pending[x] = {i for i in gate.inputs if i not in node_levels}
+            for i in pending[x]:
+                consumers[i].append(x)
+
+        order, level = [], 2
+        queue = [x for x, a in pending.items() if not a]
+        while queue:
+            next_queue = []
+            for x in queue:
+                gate = self.kwargs['gates'][x]
+                order.append(gate)
+                node_levels[gate.name] = level
+                levels[level].append(gate.name)
+                for i in gate.inputs:
+                    parents[gate.name].add(i)
+                    for j in parents.get(i, []):
+                        parents[gate.name].add(j)
+
+            for x in queue:
+                for c in consumers.get(self.kwargs['gates'][x].name, []):
+                    pending[c].discard(self.kwargs['gates'][x].name)
+                    if not pending[c] and c not in next_queue:
+                        next_queue.append(c)
+
+            queue = sorted(next_queue)
+            level += 1
+
+        active = {j for i in self.kwargs['outputs'] for j in [i.input, *parents.get(i.input, [])]}
+        return {
+            'order':order,
+            'levels':levels,
+            'node_levels':node_levels,
+            'parents':parents,
+            'active':active,
+            'active_order':[i for i in order if i.name in active]
+        }
+
+    def begin(self) -> None:
+        '''starts recording wiring edits made through set_input, add_input and add_gate, so they can be undone'''
+        self._journal = []
+
+    def commit(self) -> None:
+        self._journal = None
+
+    def rollback(self) -> None:
+        for entry, gate, *args in reversed(self._journal):
+            if entry == 'input':
+                self.replace_input(gate, *args)
+            
+            elif entry == 'append':
+                self.replace_input(gate, len(gate.inputs) - 1, None)
+                gate.inputs.pop()
+
+            else:
+                self.kwargs['gates'].pop()
+                del self.gate_bindings[gate.name]
+
+        self._journal = None
+        self.invalidate()
+
+    def set_input(self, gate:typing.Any, index:int, source:typing.Union[str, int]) -> int:
+        '''rewires one input of gate, returns the change in complexity'''
+        if self._journal is not None:
+            self._journal.append(('input', gate, index, gate.inputs[index]))
+
+        return self.replace_input(gate, index, source)
+
+    def add_input(self, gate:typing.Any, source:typing.Union[str, int]) -> int:
+        if self._journal is not None:
+            self._journal.append(('append', gate))
+
+        gate.inputs.append(None)
+        return self.replace_input(gate, len(gate.inputs) - 1, source)
+
+    def add_gate(self, gate:typing.Any) -> None:
+        '''new gates start inactive, so complexity is unchanged until another node links to them'''
+        if self._journal is not None:
+            self._journal.append(('gate', gate))
+
+        self.kwargs['gates'].append(gate)
+        self.gate_bindings[gate.name] = gate
+
+    def replace_input(self, gate:typing.Any, index:int, source:typing.Union[str, int, None]) -> int:
+        '''
+        updates the reference counts of the active cone when gate.inputs[index] changes
+        only the nodes that enter or leave the cone are visited, returns the change in complexity
+        '''
+        old_source, gate.inputs[index] = gate.inputs[index], source
+        if self._refs is None or not self._refs.get(gate.name):
+            return 0
+
+        complexity = self._complexity
+        if source is not None:
+            self.reference(source, 1)
+
+        if old_source is not None:
+            self.reference(old_source, -1)
+
+        return self._complexity - complexity
+
+    def reference(self, name:typing.Union[str, int], delta:int) -> None:
+        constants = {i.name for i in self.kwargs['constants']}
+        stack = [name]
+        while stack:
+            n = stack.pop()
+            self._refs[n] = self._refs.get(n, 0) + delta
+            if self._refs[n] == (1 if delta > 0 else 0):
+                if n not in constants:
+                    self._complexity += delta
+
+                if n in self.gate_bindings:
+                    stack.extend(i for i in self.gate_bindings[n].inputs if i is not None)
+
+    def count_references(self) -> None:
+        '''number of active consumers (gate inputs and outputs) of every node, built once from the plan'''
+        self._refs = collections.defaultdict(int)
+        for gate in self.plan['active_order']:
+            for i in gate.inputs:
+                self._refs[i] += 1
+
+        for i in self.kwargs['outputs']:
+            self._refs[i.input] += 1
+
+        self._refs = dict(self._refs)
+        self._complexity = len(self.plan['active'] - {i.name for i in self.kwargs['constants']})
+
+    @staticmethod
+    def activate(outputs:typing.List[int]) -> int:
+        '''majority voting'''
+        return max(collections.Counter(outputs).items(), key=lambda x:x[1])[0]
+
+    @staticmethod
+    def trait_index(traits:typing.List[int]) -> int:
+        '''position of a trait vector in itertools.product order'''
+        return functools.reduce(lambda a, b:(a << 1) | int(b), traits, 0)
+
+    def evaluate_words(self) -> typing.List[int]:
+        '''
+        bit-parallel evaluation of every possible input vector in a single pass over the active gates
+            - each input node carries one word from INPUT_WORDS, constants are all ones or all zeros
+            - returns one word per output node, bit k holding the output for the k-th vector in itertools.product order
+        '''
+        mask = (1 << 2**len(self.kwargs['inputs'])) - 1
+        values = {**{i.name:a for i, a in zip(self.kwargs['inputs'], INPUT_WORDS(len(self.kwargs['inputs'])))}, 
+                **{i.name:mask if i.value else 0 for i in self.kwargs['constants']}}
+
+        for gate in self.plan['active_order']:
+            values[gate.name] = gate.bitwise(mask, *[values[i] for i in gate.inputs])
+
+        return [values[i.input] for i in self.kwargs['outputs']]
+
+    def compile(self) -> dict:
+        '''
+        packs the genotype's response to every possible input vector
+            - 'outputs': one bitmask per output node (see evaluate_words)
+            - 'decisions': majority vote (Genotype.activate) for each input vector, ties go to the first output
+        the result is cached until the next mutation
+        '''
+        if self._compiled is None:
+            tables = self.evaluate_words()
+            self._compiled = {'outputs':tables, 'decisions':majority_decisions(tables, len(self.kwargs['inputs']))}
+
+        return self._compiled
+
+    @property
+    def truth_table(self) -> typing.List[int]:
+        return self.compile()['outputs']
+
+    @property
+    def decisions(self) -> typing.Tuple[int]:
+        return self.compile()['decisions']
+
+    def decide(self, *traits) -> int:
+        return self.decisions[self.trait_index(traits)]
+
     def __call__(self, *traits) -> typing.Any:
         assert len(traits) == len(self.kwargs['inputs'])
 
         for val, inp in zip(traits, self.kwargs['inputs']):
             inp.set_value(val)
 
-        self.traverse()
-        return [self.value_bindings[i.input] for i in self.kwargs['outputs']]
+        values = {**{i.name:i.value for i in self.kwargs['inputs']}, 
+                **{i.name:i.value for i in self.kwargs['constants']}}
+
+        for gate in self.plan['active_order']:
+            values[gate.name] = gate(*[values[i] for i in gate.inputs])
+
+        return [values[i.input] for i in self.kwargs['outputs']]
 
     def render(self, by_layer:bool = False) -> None:
         G, labels = nx.DiGraph(), {}
@@ -203,21 +469,14 @@ class Genotype:
             G.add_node(i.name, layer = 1)
             labels[i.name] = f'Constant({i.name})'
 
-        values = {**{i.name:i.value for i in self.kwargs['inputs']}, 
-                **{i.name:i.value for i in self.kwargs['constants']}}
-        
-        seen, layer = [], 2
-        while (queue:=[gate for gate in self.kwargs['gates'] if all(i in values for i in gate.inputs) and gate.name not in seen]):
-            for gate in queue:
-                G.add_node(gate.name, layer = layer)
-                labels[gate.name] = f'{gate.__class__.__name__}({gate.name},l={gate.layer})'
-                seen.append(gate.name)
-                values[gate.name] = gate(*[values[i] for i in gate.inputs])
-                for i in gate.inputs:
-                    G.add_edge(i, gate.name)
-
-            layer += 1
+        plan = self.plan
+        for gate in plan['order']:
+            G.add_node(gate.name, layer = plan['node_levels'][gate.name])
+            labels[gate.name] = f'{gate.__class__.__name__}({gate.name},l={plan["node_levels"][gate.name]})'
+            for i in gate.inputs:
+                G.add_edge(i, gate.name)
 
+        layer = max(plan['levels']) + 1
         for i in self.kwargs['outputs']:
             G.add_node(i.name, layer = layer)
             labels[i.name] = f'Output({i.name})'
@@ -235,57 +494,53 @@ class Genotype:
 
     @property
     def complexity(self) -> int:
-        if self.value_bindings is None:
-            self.traverse()
-        
-        parent_gates = set()
-        for i in self.kwargs['outputs']:
-            if i.input in self.gate_bindings:
-                for j in self.gate_bindings[i.input].parents:
-                    parent_gates.add(j)
-            
-            parent_gates.add(i.input)
-
+        '''number of non-constant nodes in the active cone of the outputs, maintained incrementally across mutations'''
+        if self._complexity is None:
+            self.count_references()
 
-        return len(parent_gates - {i.name for i in self.kwargs['constants']})
+        return self._complexity
 
 
-    @classmethod
-    def parents_and_levels(cls, G:'Genotype') -> dict:
-        parents = collections.defaultdict(set)
-        levels = collections.defaultdict(list)
-        if G.value_bindings is not None:
-            levels[1] = [i.name for i in G.kwargs['inputs']] + [i.name for i in G.kwargs['constants']]
-            for gate in G.kwargs['gates']:
-                for i in gate.parents:
-                    parents[gate.name].add(i)
-                levels[gate.layer].append(gate.name)
-
-            return parents, levels
+    @property
+    def fingerprint(self) -> bytes:
+        '''
+        canonical hash of the active circuit, independent of node names
+            - inputs hash by position, constants by value, gates by type and the (sorted, except for NOT) hashes of their inputs
+            - the result combines the output hashes in order with the hashes of every node in the active cone,
+              so a shared subcircuit and two identical copies of it differ
+        genotypes with equal fingerprints have the same truth tables, decisions and complexity
+        '''
+        if self._fingerprint is None:
+            digest = lambda b: hashlib.blake2b(b, digest_size = 16).digest()
+            hashes = {**{i.name:digest(b'I%d' % x) for x, i in enumerate(self.kwargs['inputs'])},
+                **{i.name:digest(b'C%d' % bool(i.value)) for i in self.kwargs['constants']}}
+            for gate in self.plan['active_order']:
+                if isinstance(gate, node.operator.NOT):
+                    #NOT evaluates the name of its input, see node.operator.NOT
+                    hashes[gate.name] = digest(b'NOT%d' % (not gate.inputs[0]) + hashes[gate.inputs[0]])
+                
+                else:
+                    hashes[gate.name] = digest(gate.__class__.__name__.encode() + b''.join(sorted(hashes[i] for i in gate.inputs)))
 
-        levels[1] = [i.name for i in G.kwargs['inputs']] + [i.name for i in G.kwargs['constants']]
-        all_seen_nodes, level_count = [*levels[1]], 2
-        while (queue:=[i for i in G.kwargs['gates'] if i.name not in all_seen_nodes and all(j in all_seen_nodes for j in i.inputs)]):
-            for gate in queue:
-                levels[level_count].append(gate.name)
-                all_seen_nodes.append(gate.name)
-                for i in gate.inputs:
-                    parents[gate.name].add(i)
-                    for j in parents.get(i, []):
-                        parents[gate.name].add(j)
+            self._fingerprint = digest(b''.join(hashes[i.input] for i in self.kwargs['outputs']) + b'|' + 
+                b''.join(sorted(hashes[i] for i in self.plan['active'])))
 
-            level_count += 1
+        return self._fingerprint
 
+    @classmethod
+    def parents_and_levels(cls, G:'Genotype') -> dict:
+        '''the ancestor sets are shared with G.plan and must not be modified in place'''
+        plan = G.plan
+        parents = collections.defaultdict(set, plan['parents'])
+        levels = collections.defaultdict(list, {a:[*b] for a, b in plan['levels'].items()})
         return parents, levels
 
     @classmethod
     def g_complexity(cls, G:'Genotype') -> int:
-        parents, levels = cls.parents_and_levels(G)
-        vals = {j for i in G.kwargs['outputs'] for j in [i.input, *parents[i.input]]}
-        return len(vals - {i.name for i in G.kwargs['constants']})
+        return G.complexity
 
     @classmethod
-    def activate_node(cls, G:'Genotype') -> 'Genotype':
+    def activate_node(cls, G:'Genotype', rng:typing.Any = random) -> 'Genotype':
         parents, levels = cls.parents_and_levels(G)
         node_levels = {j:a for a, b in levels.items() for j in b}
         active = {j for i in G.kwargs['outputs'] for j in [i.input, *parents.get(i.input, [])]}
@@ -293,7 +548,7 @@ class Genotype:
         inactive = {j for a, b in parents.items() for j in [a, *b] if max(levels) != node_levels[j] and min(levels) != node_levels[j]} - active
         if not inactive:
             #print('no inactive nodes, creating node')
-            _gate = random.choice([node.operator.NAND, node.operator.AND, 
+            _gate = rng.choice([node.operator.NAND, node.operator.AND, 
                 node.operator.OR, node.operator.NOR])
             n_g_ID = max(max(i.name for i in G.kwargs['inputs']),
                         max([i.name for i in G.kwargs['constants']]+[0]),
@@ -303,36 +558,38 @@ class Genotype:
             if not (t_l:=[i for i in levels if i != min(levels) and i != max(levels)]):
                 return G
 
-            n_g_level = random.choice(t_l)
-            inputs = random.sample([a for a, b in node_levels.items() if b < n_g_level and n_g_level - b <= G.levels_back], 2)
+            n_g_level = rng.choice(t_l)
+            inputs = rng.sample([a for a, b in node_levels.items() if b < n_g_level and n_g_level - b <= G.levels_back], 2)
             new_gate = _gate(n_g_ID, inputs = inputs)
-            G.kwargs['gates'].append(new_gate)
+            G.add_gate(new_gate)
             parents[n_g_ID] = {*inputs, *[j for i in inputs for j in parents.get(i, [])]}
             levels[n_g_level].append(n_g_ID)
             node_levels[n_g_ID] = n_g_level
             inactive.add(n_g_ID)
 
-        to_activate = random.choice([*inactive])
+        to_activate = rng.choice([*inactive])
         #print('activating this node', to_activate)
         if not (t_l:=[i for i in active if node_levels[i] > node_levels[to_activate] and node_levels[i] - node_levels[to_activate] <= G.levels_back]):
+            G.invalidate()
             return G
 
-        link_to = random.choice(t_l)
+        link_to = rng.choice(t_l)
         #print('linking to', link_to)
         for gate in G.kwargs['gates']:
             if gate.name == link_to:
-                gate.inputs.append(to_activate)
+                G.add_input(gate, to_activate)
         
+        G.invalidate()
         return G
 
     @classmethod
-    def deactivate_node(cls, G:'Genotype') -> 'Genotype':
+    def deactivate_node(cls, G:'Genotype', rng:typing.Any = random) -> 'Genotype':
         parents, levels = cls.parents_and_levels(G)
         node_levels = {j:a for a, b in levels.items() for j in b}
         active = {j for i in G.kwargs['outputs'] for j in [i.input, *parents.get(i.input, [])]}
         active = {i for i in active if node_levels[i] != min(levels) and node_levels[i] != max(levels) and not any(k.input == i for k in G.kwargs['outputs'])}
         if active:
-            to_deactivate = random.choice([*active])
+            to_deactivate = rng.choice([*active])
             #print('deactivating this node', to_deactivate)
             for gate in G.kwargs['gates']:
                 for x, a in enumerate(gate.inputs):
@@ -340,34 +597,38 @@ class Genotype:
                         rewire_options = {*G.gate_bindings[to_deactivate].inputs} - {*gate.inputs}
                         if not rewire_options:
                             rewire_options = {max(parents[to_deactivate])}
-                        gate.inputs[x] = random.choice([*rewire_options])
+                        G.set_input(gate, x, rng.choice([*rewire_options]))
                         #print('rewriting', gate.name, 'input to', gate.inputs[x])
+        
+        G.invalidate()
         return G
 
     @classmethod
-    def rewire_node(cls, G:'Genotype') -> 'Genotype':
+    def rewire_node(cls, G:'Genotype', rng:typing.Any = random) -> 'Genotype':
         parents, levels = cls.parents_and_levels(G)
         node_levels = {j:a for a, b in levels.items() for j in b}
         active = {j for i in G.kwargs['outputs'] for j in [i.input, *parents.get(i.input, [])]}
         active = {i for i in active if node_levels[i] != min(levels)}
         for _ in range(10):
-            to_rewire = random.choice([*active])
-            c_ind = random.choice([*range(len(G.gate_bindings[to_rewire].inputs))])
+            to_rewire = rng.choice([*active])
+            c_ind = rng.choice([*range(len(G.gate_bindings[to_rewire].inputs))])
             if not (s_options:=[*{a for a, b in node_levels.items() if b < node_levels[to_rewire] and node_levels[to_rewire] - b <= G.levels_back and a not in G.gate_bindings[to_rewire].inputs}]):
                 continue
 
             #print('to rewire', to_rewire)
-            new_source = random.choice(s_options)
+            new_source = rng.choice(s_options)
             for gate in G.kwargs['gates']:
                 if gate.name == to_rewire:
                     #print('c_ind', c_ind, 'c_ind value', gate.inputs[c_ind], 'and new_source', new_source)
-                    gate.inputs[c_ind] = new_source
+                    G.set_input(gate, c_ind, new_source)
             break
 
+        G.invalidate()
         return G
 
     def mutate_v2(self, choice:typing.Union[None, int] = None, gates = [node.operator.NAND, node.operator.AND, 
-                node.operator.OR, node.operator.NOR]) -> None:
+                node.operator.OR, node.operator.NOR], rng:typing.Any = random) -> None:
+        '''@rng: any object with the random module's interface, e.g. a random.Random stream'''
     
         self.reset()
         choices = [1, 2, 3, 4] if choice is None else [choice]
@@ -379,31 +640,24 @@ class Genotype:
             
         #TODO: cut down on nuisance and noise mutations (https://jbiomedsci.biomedcentral.com/articles/10.1186/s12929-023-00959-7)
         #https://www.annualreviews.org/doi/full/10.1146/annurev.micro.57.030502.090855
-        if (mutation:=random.choice(choices)) == 1:
-            count = 0
+        if (mutation:=rng.choice(choices)) == 1:
+            count, original_complexity = 0, self.__class__.g_complexity(self)
             while count < 10:
-                g = self.__class__.activate_node(copy.deepcopy(self))
-                if self.__class__.g_complexity(g) > self.__class__.g_complexity(self):
-                    #print('complexity change', self.__class__.g_complexity(self), self.__class__.g_complexity(g))
-                    self.kwargs['gates'] = g.kwargs['gates']
-                    self.gate_bindings = {}
-                    for i in g.kwargs['gates']:
-                        self.gate_bindings[i.name] = i
-
+                self.begin()
+                self.__class__.activate_node(self, rng)
+                if self.__class__.g_complexity(self) > original_complexity:
+                    #print('complexity change', original_complexity, self.__class__.g_complexity(self))
+                    self.commit()
                     break
 
+                self.rollback()
                 count += 1
 
         elif mutation == 2:
             #print("REMOVE NODE")
             #when deactivating, the odds are high of strong effects, since the act of rewiring signifcantly increases the probability that the chosen parent of the targt node will have fewer nodes in its active branch
             #thus, deactivation probabilities should decrease as the number of levels increases
-            g = self.__class__.deactivate_node(copy.deepcopy(self))
-            #print('complexity change', self.__class__.g_complexity(self), self.__class__.g_complexity(g))
-            self.kwargs['gates'] = g.kwargs['gates']
-            self.gate_bindings = {}
-            for i in g.kwargs['gates']:
-                self.gate_bindings[i.name] = i
+            self.__class__.deactivate_node(self, rng)
 
         elif mutation == 3:
             #print('REWIRE EDGE')
@@ -412,24 +666,23 @@ class Genotype:
             #if change => exists, chose it, else, skip mutation
             original_complexity = self.__class__.g_complexity(self)
             for _ in range(10):
-                g = self.__class__.rewire_node(copy.deepcopy(self))
-                if (c1:=self.__class__.g_complexity(g)) >= original_complexity:
+                self.begin()
+                self.__class__.rewire_node(self, rng)
+                if (c1:=self.__class__.g_complexity(self)) >= original_complexity:
                     #print('successful rewire', original_complexity, c1)
-                    self.kwargs['gates'] = g.kwargs['gates']
-                    self.gate_bindings = {}
-                    for i in g.kwargs['gates']:
-                        self.gate_bindings[i.name] = i
-                
+                    self.commit()
                     break
 
+                self.rollback()
+
         elif mutation == 4:
             #print('UPDATE NODE')
-            gate = self.gate_bindings[random.choice([*self.gate_bindings])]
-            new_gate = random.choice([i for i in gates if not isinstance(gate, i)])(gate.name, inputs = gate.inputs)
+            gate = self.gate_bindings[rng.choice([*self.gate_bindings])]
+            new_gate = rng.choice([i for i in gates if not isinstance(gate, i)])(gate.name, inputs = gate.inputs)
             self.gate_bindings[gate.name] = new_gate
             self.kwargs['gates'] = [i if i.name != new_gate.name else new_gate for i in self.kwargs['gates']]
 
-        
+        self.invalidate()
 
     def mutate(self, choice:typing.Union[None, int] = None,
             gates = [node.operator.NAND, node.operator.AND, 
@@ -509,31 +762,24 @@ class Genotype:
                 self.gate_bindings[gate.name] = new_gate
                 self.kwargs['gates'] = [i if i.name != new_gate.name else new_gate for i in self.kwargs['gates']]
                 
+        self.invalidate(complexity = True)
 
     def traverse(self) -> None:
         values = {**{i.name:i.value for i in self.kwargs['inputs']}, 
                 **{i.name:i.value for i in self.kwargs['constants']}}
         
-        seen, layer = [], 2
-        while (queue:=[gate for gate in self.kwargs['gates'] if all(i in values for i in gate.inputs) and gate.name not in seen]):
-            for gate in queue:
-                seen.append(gate.name)
-                values[gate.name] = gate(*[values[i] for i in gate.inputs])
-                for i in gate.inputs:
-                    if i in self.gate_bindings:
-                        gate.parents = {*gate.parents, *self.gate_bindings[i].parents, i}
-                    else:
-                        gate.parents = {*gate.parents, i}
-
-                    gate.layer = layer
-            
-            layer += 1
+        plan = self.plan
+        for gate in plan['order']:
+            values[gate.name] = gate(*[values[i] for i in gate.inputs])
+            if gate.inputs:
+                gate.parents = {*plan['parents'][gate.name]}
+                gate.layer = plan['node_levels'][gate.name]
             
         self.value_bindings = values
 
     @classmethod
     @VALIDATE_GENOTYPE(max_attempts = 10)
-    def random_genotype_m1(cls, inputs:int, constants:int, depth:int, outputs:int, levels_back:int = 1) -> 'Genotype':
+    def random_genotype_m1(cls, inputs:int, constants:int, depth:int, outputs:int, levels_back:int = 1, rng:typing.Any = random) -> 'Genotype':
         I = itertools.count(0)
         inp = [node.Input(int, next(I)) for _ in range(inputs)]
         constants = [node.Constant(int, next(I), value = 0) for _ in range(constants)]
@@ -541,10 +787,10 @@ class Genotype:
         for _ in range(depth):
             new_level, possible_parents = [], [j for k in levels[-1*levels_back:] for j in k]
             for _ in range(inputs):
-                _gate = random.choice([node.operator.NAND, node.operator.AND, 
+                _gate = rng.choice([node.operator.NAND, node.operator.AND, 
                     node.operator.OR, node.operator.NOR])
 
-                new_gate = _gate(next(I), inputs = [i.name for i in random.sample(possible_parents, 2)])
+                new_gate = _gate(next(I), inputs = [i.name for i in rng.sample(possible_parents, 2)])
                 new_level.append(new_gate)
                 gates.append(new_gate)
 
@@ -554,7 +800,7 @@ class Genotype:
             inputs = inp,
             constants = constants,
             gates = gates,
-            outputs = [node.Output(int, next(I), i.name) for i in random.sample(levels[-1], outputs)],
+            outputs = [node.Output(int, next(I), i.name) for i in rng.sample(levels[-1], outputs)],
             params = {'inputs':inputs, 
                 'constants':constants, 
                 'depth':depth, 
@@ -562,6 +808,58 @@ class Genotype:
                 'levels_back':levels_back}
         )
 
+    @classmethod
+    def random_genotypes_m1(cls, n:int, inputs:int, constants:int, depth:int, outputs:int, levels_back:int = 1,
+            rng:typing.Optional[np.random.Generator] = None, max_attempts:int = 10) -> typing.List['Genotype']:
+        '''
+        n genotypes distributed like random_genotype_m1, every random choice of all n is drawn at once from @rng
+            - names and layout match random_genotype_m1: inputs, constants, then `inputs` gates per level, then the outputs
+            - draws that leave an input unused are redrawn up to @max_attempts times, as VALIDATE_GENOTYPE does
+        '''
+        rng = np.random.default_rng() if rng is None else rng
+        gate_types = [node.operator.NAND, node.operator.AND, node.operator.OR, node.operator.NOR]
+        first_gate = inputs + constants
+        #gates of level l (from 0) can take any two distinct nodes of the `levels_back` levels before it, a contiguous range of names
+        #level 0 holds the inputs and the constants, a window reaching back to it starts at name 0
+        windows = [(0 if l < levels_back else first_gate + (l - levels_back)*inputs, first_gate + l*inputs) for l in range(depth)]
+        low = np.array([a for a, _ in windows])[:, None]
+        size = np.array([b - a for a, b in windows])[:, None]
+
+        def draw(m:int) -> tuple:
+            types = rng.integers(len(gate_types), size = (m, depth, inputs))
+            first = rng.integers(low, low + size, size = (m, depth, inputs))
+            second = rng.integers(low, low + size - 1, size = (m, depth, inputs))
+            second += second >= first
+            chosen = np.argsort(rng.random((m, inputs)), axis = 1)[:, :outputs]
+            return types, np.stack([first, second], axis = -1), chosen
+
+        types, parents, chosen = draw(n)
+        for _ in range(max_attempts):
+            if not len(invalid:=np.flatnonzero(~np.all([(parents == i).any(axis = (1, 2, 3)) for i in range(inputs)], axis = 0))):
+                break
+
+            types[invalid], parents[invalid], chosen[invalid] = draw(len(invalid))
+
+        genotypes, last_level = [], first_gate + (depth - 1)*inputs
+        for g_types, g_parents, g_chosen in zip(types.tolist(), parents.tolist(), chosen.tolist()):
+            inp = [node.Input(int, i) for i in range(inputs)]
+            const = [node.Constant(int, inputs + i, value = 0) for i in range(constants)]
+            gates = [gate_types[t](first_gate + l*inputs + s, inputs = p) for l, (l_types, l_parents) in enumerate(zip(g_types, g_parents))
+                for s, (t, p) in enumerate(zip(l_types, l_parents))]
+            genotypes.append(cls(
+                inputs = inp,
+                constants = const,
+                gates = gates,
+                outputs = [node.Output(int, first_gate + depth*inputs + j, last_level + i) for j, i in enumerate(g_chosen)],
+                params = {'inputs':inputs,
+                    'constants':const,
+                    'depth':depth,
+                    'outputs':outputs,
+                    'levels_back':levels_back}
+            ))
+
+        return genotypes
+
 
     @classmethod
     def random_genotype(cls, inputs:int, constants:int, depth:int, outputs:int = 1) -> 'Genotype':
@@ -615,6 +913,9 @@ class Genotype:
                 'outputs':outputs}
         )
 
+    def pack(self) -> 'PackedGenotype':
+        return PackedGenotype(self)
+
     def to_json(self) -> dict:
         return {
             'inputs':[i.name for i in self.kwargs['inputs']],
@@ -626,6 +927,243 @@ class Genotype:
     def __repr__(self) -> str:
         return json.dumps({a:[*map(repr, b)] for a, b in self.kwargs.items()}, indent=4)
 
+class PackedGenotype:
+    """
+    compact, array-backed form of a Genotype with the same public interface
+    (__call__, complexity, decisions, mutate_v2, to_json, render)
+
+    nodes are numbered inputs, constants, then gates in kwargs['gates'] order:
+        - names: original name of every node
+        - types: one code per gate (PackedGenotype.CODES)
+        - offsets/sources: the gate inputs in compressed row form, gate x reads sources[offsets[x]:offsets[x + 1]]
+        - order: active gates in evaluation order
+        - outputs: node index feeding each output, output_names: names of the output nodes
+    mutate_v2 and render unpack to a Genotype and repack the result
+    an actor can hold its genotype in this form (actor.genotype = actor.genotype.pack()): Environment.run_interactions and
+    EvaluationCache read its fingerprint, compiled decisions and complexity, only GenotypeBatch needs a Genotype
+    """
+    CODES = {'AND':0, 'OR':1, 'NAND':2, 'NOR':3, 'NOT':4}
+    GATES = {0:node.operator.AND, 1:node.operator.OR, 2:node.operator.NAND, 3:node.operator.NOR, 4:node.operator.NOT}
+    __slots__ = ('inputs', 'constants', 'names', 'types', 'offsets', 'sources', 'order', 'outputs', 'output_names', 'params', '_compiled', '_complexity', '_fingerprint')
+
+    def __init__(self, genotype:'Genotype') -> None:
+        self.pack(genotype)
+
+    def pack(self, genotype:'Genotype') -> None:
+        nodes = genotype.kwargs['inputs'] + genotype.kwargs['constants'] + genotype.kwargs['gates']
+        index = {a.name:i for i, a in enumerate(nodes)}
+        self.inputs = len(genotype.kwargs['inputs'])
+        self.constants = array('b', [bool(i.value) for i in genotype.kwargs['constants']])
+        self.names = array('q', [i.name for i in nodes])
+        self.types = array('b', [self.CODES[i.__class__.__name__] for i in genotype.kwargs['gates']])
+        self.offsets = array('i', [0])
+        self.sources = array('i')
+        for gate in genotype.kwargs['gates']:
+            self.sources.extend(index[i] for i in gate.inputs)
+            self.offsets.append(len(self.sources))
+
+        self.order = array('i', [index[i.name] - self.inputs - len(self.constants) for i in genotype.plan['active_order']])
+        self.outputs = array('i', [index[i.input] for i in genotype.kwargs['outputs']])
+        self.output_names = array('q', [i.name for i in genotype.kwargs['outputs']])
+        self.params = copy.deepcopy(genotype.kwargs.get('params', {}))
+        self._compiled = None
+        self._complexity = None
+        self._fingerprint = genotype.fingerprint
+
+    def unpack(self) -> 'Genotype':
+        first_gate = self.inputs + len(self.constants)
+        return Genotype(
+            inputs = [node.Input(int, i) for i in self.names[:self.inputs]],
+            constants = [node.Constant(int, i, int(j)) for i, j in zip(self.names[self.inputs:first_gate], self.constants)],
+            gates = [self.GATES[t](self.names[first_gate + x], inputs = [self.names[i] for i in self.sources[self.offsets[x]:self.offsets[x + 1]]]) 
+                        for x, t in enumerate(self.types)],
+            outputs = [node.Output(int, i, self.names[j]) for i, j in zip(self.output_names, self.outputs)],
+            params = copy.deepcopy(self.params)
+        )
+
+    def copy(self) -> 'PackedGenotype':
+        clone = self.__class__.__new__(self.__class__)
+        for i in self.__slots__:
+            setattr(clone, i, getattr(self, i))
+
+        clone.params = copy.deepcopy(self.params)
+        for i in ['constants', 'names', 'types', 'offsets', 'sources', 'order', 'outputs', 'output_names']:
+            setattr(clone, i, array(getattr(self, i).typecode, getattr(self, i)))
+
+        return clone
+
+    def __copy__(self) -> 'PackedGenotype':
+        return self.copy()
+
+    def __deepcopy__(self, _) -> 'PackedGenotype':
+        return self.copy()
+
+    def evaluate_words(self) -> typing.List[int]:
+        """same result as Genotype.evaluate_words, computed directly on the arrays"""
+        mask, first_gate = (1 << 2**self.inputs) - 1, self.inputs + len(self.constants)
+        values = [*INPUT_WORDS(self.inputs), *[mask if i else 0 for i in self.constants], *[0 for _ in self.types]]
+        for x in self.order:
+            words = [values[i] for i in self.sources[self.offsets[x]:self.offsets[x + 1]]]
+            if (t:=self.types[x]) == 4:
+                values[first_gate + x] = 0 if self.names[self.sources[self.offsets[x]]] else mask
+
+            elif t in (0, 2):
+                values[first_gate + x] = functools.reduce(int.__and__, words, mask) ^ (mask if t == 2 else 0)
+
+            else:
+                values[first_gate + x] = functools.reduce(int.__or__, words, 0) ^ (mask if t == 3 else 0)
+
+        return [values[i] for i in self.outputs]
+
+    def compile(self) -> dict:
+        if self._compiled is None:
+            tables = self.evaluate_words()
+            self._compiled = {'outputs':tables, 'decisions':majority_decisions(tables, self.inputs)}
+
+        return self._compiled
+
+    @property
+    def truth_table(self) -> typing.List[int]:
+        return self.compile()['outputs']
+
+    @property
+    def decisions(self) -> typing.Tuple[int]:
+        return self.compile()['decisions']
+
+    def decide(self, *traits) -> int:
+        return self.decisions[Genotype.trait_index(traits)]
+
+    def __call__(self, *traits) -> typing.List[bool]:
+        assert len(traits) == self.inputs
+        ind = Genotype.trait_index(traits)
+        return [bool(i >> ind & 1) for i in self.truth_table]
+
+    @property
+    def complexity(self) -> int:
+        if self._complexity is None:
+            first_gate, seen, stack = self.inputs + len(self.constants), set(), [*self.outputs]
+            while stack:
+                if (n:=stack.pop()) not in seen:
+                    seen.add(n)
+                    if n >= first_gate:
+                        stack.extend(self.sources[self.offsets[n - first_gate]:self.offsets[n - first_gate + 1]])
+
+            self._complexity = len({i for i in seen if not self.inputs <= i < first_gate})
+
+        return self._complexity
+
+    @property
+    def fingerprint(self) -> bytes:
+        return self._fingerprint
+
+    def mutate_v2(self, *args, **kwargs) -> None:
+        genotype = self.unpack()
+        genotype.mutate_v2(*args, **kwargs)
+        self.pack(genotype)
+
+    def to_json(self) -> dict:
+        return self.unpack().to_json()
+
+    def render(self, by_layer:bool = False) -> None:
+        self.unpack().render(by_layer)
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__} gates={len(self.types)} outputs={len(self.outputs)}>'
+
+
+class GenotypeBatch:
+    '''
+    vectorized evaluation of a whole population of genotypes sharing the same inputs and outputs
+    (Genotype only, EvaluationCache evaluates PackedGenotype rows from their compiled words)
+
+    every genotype is packed into one row of a node value array with shape (population, slots, 2**inputs):
+        - slot 0 is all zeros and slot 1 all ones (constants are mapped onto these)
+        - the next slots hold the input nodes, followed by the active gates of each genotype
+        - the last slot is a sink written to by the padding gates
+    the active gates are grouped by level, so each level is evaluated for the whole population in one numpy step
+    '''
+    CODES = {'AND':0, 'OR':1, 'NAND':2, 'NOR':3}
+
+    def __init__(self, genotypes:typing.List['Genotype']) -> None:
+        self.size = len(genotypes)
+        self.inputs = len(genotypes[0].kwargs['inputs'])
+        self.outputs = len(genotypes[0].kwargs['outputs'])
+        assert all(len(i.kwargs['inputs']) == self.inputs and len(i.kwargs['outputs']) == self.outputs for i in genotypes)
+
+        self.slots = 2 + self.inputs + max(len(i.plan['active_order']) for i in genotypes) + 1
+        self.output_slots = np.zeros((self.size, self.outputs), dtype = np.int64)
+        packed_levels = collections.defaultdict(list)
+        for row, genotype in enumerate(genotypes):
+            gates, self.output_slots[row] = self.pack_genotype(genotype)
+            for level, *gate in gates:
+                packed_levels[level].append((row, *gate))
+
+        self.levels = [self.pack_level(packed_levels[i]) for i in sorted(packed_levels)]
+
+    @classmethod
+    def pack_genotype(cls, genotype:'Genotype') -> typing.Tuple[list, list]:
+        '''(level, target slot, gate code, input slots) per active gate and the output slots, cached on the genotype's plan'''
+        if 'packed' not in (plan:=genotype.plan):
+            slots = {**{i.name:2 + j for j, i in enumerate(genotype.kwargs['inputs'])},
+                **{i.name:int(bool(i.value)) for i in genotype.kwargs['constants']}}
+
+            gates = []
+            for x, gate in enumerate(plan['active_order']):
+                slots[gate.name] = 2 + len(genotype.kwargs['inputs']) + x
+                gates.append((plan['node_levels'][gate.name], *cls.pack_gate(gate, slots)))
+
+            plan['packed'] = (gates, [slots[i.input] for i in genotype.kwargs['outputs']])
+
+        return plan['packed']
+
+    @classmethod
+    def pack_gate(cls, gate:typing.Any, slots:dict) -> typing.Tuple[int, int, typing.List[int]]:
+        if isinstance(gate, node.operator.NOT):
+            return slots[gate.name], cls.CODES['OR'], [int(not gate.inputs[0])]
+
+        if not gate.inputs:
+            return slots[gate.name], cls.CODES[gate.__class__.__name__], [int(isinstance(gate, (node.operator.AND, node.operator.NAND)))]
+
+        return slots[gate.name], cls.CODES[gate.__class__.__name__], [slots[i] for i in gate.inputs]
+
+    def pack_level(self, gates:typing.List[tuple]) -> typing.Tuple[np.ndarray]:
+        '''pads one level to (population, width) gate codes and (population, width, fan-in) input slots'''
+        fan_in = max(len(inputs) for *_, inputs in gates)
+        columns, cols = collections.defaultdict(int), []
+        for row, *_ in gates:
+            cols.append(columns[row])
+            columns[row] += 1
+
+        rows, targets, codes, inputs = zip(*gates)
+        packed_targets = np.full((self.size, max(columns.values())), self.slots - 1, dtype = np.int64)
+        packed_codes = np.full(packed_targets.shape, self.CODES['OR'], dtype = np.int8)
+        packed_sources = np.zeros((*packed_targets.shape, fan_in), dtype = np.int64)
+        packed_targets[rows, cols] = targets
+        packed_codes[rows, cols] = codes
+        packed_sources[rows, cols] = [i + [i[0]]*(fan_in - len(i)) for i in inputs]
+        return packed_targets, packed_codes, packed_sources
+
+    def evaluate(self) -> np.ndarray:
+        '''boolean array of shape (population, outputs, 2**inputs)'''
+        values = np.zeros((self.size, self.slots, 2**self.inputs), dtype = bool)
+        values[:, 1] = True
+        values[:, 2:2 + self.inputs] = np.array(list(itertools.product(*[[0, 1] for _ in range(self.inputs)])), dtype = bool).T
+        rows = np.arange(self.size)[:, None]
+        for targets, codes, sources in self.levels:
+            inputs = values[rows[:, :, None], sources]
+            result = np.where(((codes == self.CODES['AND']) | (codes == self.CODES['NAND']))[..., None], 
+                        inputs.all(axis = 2), inputs.any(axis = 2))
+            result ^= ((codes == self.CODES['NAND']) | (codes == self.CODES['NOR']))[..., None]
+            values[rows, targets] = result
+
+        return values[rows, self.output_slots]
+
+    def decisions(self) -> np.ndarray:
+        '''majority vote of the outputs (ties go to the first output), shape (population, 2**inputs)'''
+        outputs = self.evaluate()
+        votes = outputs.sum(axis = 1)*2
+        return (votes > self.outputs) | ((votes == self.outputs) & outputs[:, 0])
+
 
 if __name__ == '__main__':
     def DEFAULT_GENOTYPE_1():
@@ -797,6 +1335,29 @@ if __name__ == '__main__':
         #19.01 on random levels back adjustment
     
     
+    def test_random_genotypes_m1(n, *args, tolerance = 0.02) -> None:
+        '''compares random_genotypes_m1 with random_genotype_m1: parent frequencies per gate level and the share of valid circuits'''
+        inputs, constants, depth = args[:3]
+        def stats(genotypes):
+            parents = collections.defaultdict(collections.Counter)
+            for g in genotypes:
+                for gate in g.kwargs['gates']:
+                    parents[(gate.name - inputs - constants)//inputs].update(gate.inputs)
+
+            valid = sum(all(any(i.name in j.inputs for j in g.kwargs['gates']) for i in g.kwargs['inputs']) for g in genotypes)
+            return {a:{x:y/sum(b.values()) for x, y in b.items()} for a, b in parents.items()}, valid/len(genotypes)
+
+        (p1, v1), (p2, v2) = stats([Genotype.random_genotype_m1(*args) for _ in range(n)]), stats(Genotype.random_genotypes_m1(n, *args))
+        for level in range(depth):
+            assert set(p1[level]) == set(p2[level]), (level, sorted(p1[level]), sorted(p2[level]))
+            assert all(abs(p1[level][i] - p2[level][i]) < tolerance for i in p1[level]), (level, p1[level], p2[level])
+
+        assert abs(v1 - v2) < tolerance, (v1, v2)
+        print('random_genotypes_m1 matches random_genotype_m1', args, 'valid:', v1, v2)
+
+    #test_random_genotypes_m1(5000, 4, 2, 3, 2, 1)
+    #test_random_genotypes_m1(5000, 4, 2, 5, 3, 2)
+    #test_random_genotypes_m1(5000, 4, 0, 4, 4, 3)
     test_mutation_over_random(Genotype.random_genotype, 'mutate', 5, 2, 5, 1)
     #test_mutation_over_random(Genotype.random_genotype, 5, 2, 5, 4)
     #test_mutation_over_random(Genotype.random_genotype_m1, 'mutate_v2', 4, 0, 4, 4, 3)
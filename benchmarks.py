@@ -0,0 +1,225 @@
+'''
+benchmarks of the genotype and environment hot paths, with fixed seeds so runs of different commits are comparable
+
+    python benchmarks.py                                  #full grid, written to benchmarks_<commit>.json
+    python benchmarks.py --quick --filter genotype         #small grid, benchmarks whose name contains "genotype"
+    python benchmarks.py --compare benchmarks_a.json benchmarks_b.json
+
+genotype benchmarks run over circuit depths (random_genotype_m1(4, 0, depth, 4, 3)), environment benchmarks over population sizes.
+every timing is seconds per call: min, median and mean over `repeat` rounds of `number` calls, the state each call needs
+(fresh copies to mutate, a scored population to reproduce) is prepared outside the timed loop
+'''
+import protest_actors as pa, protest_coev as pc
+from actor_genotype import Genotype
+import argparse, contextlib, copy, io, json, os, platform, random, statistics, subprocess, sys, time, typing
+import numpy as np
+
+SEED = 0
+DEPTHS = [4, 8, 16, 32, 64]
+POPULATIONS = [50, 500, 5000]
+QUICK = {'depth':[4, 16], 'population':[50, 200]}
+BENCHMARKS = {}
+
+def benchmark(grid:str, number:int = 100, repeat:int = 5, name:typing.Optional[str] = None) -> typing.Callable:
+    '''
+    registers a benchmark run for every value of @grid ('depth' or 'population')
+    the function takes the grid value and returns (run, prepare): run(state) is timed, prepare() builds its state untimed
+    '''
+    def wrapper(f:typing.Callable) -> typing.Callable:
+        BENCHMARKS[name or f.__name__] = {'f':f, 'grid':grid, 'number':number, 'repeat':repeat}
+        return f
+
+    return wrapper
+
+def seed_all(seed:int) -> None:
+    random.seed(seed)
+    np.random.seed(seed)
+
+def measure(run:typing.Callable, prepare:typing.Optional[typing.Callable], number:int, repeat:int) -> dict:
+    times = []
+    for _ in range(repeat):
+        states = [None if prepare is None else prepare() for _ in range(number)]
+        start = time.perf_counter()
+        for state in states:
+            run(state)
+
+        times.append((time.perf_counter() - start)/number)
+
+    return {'min':min(times), 'median':statistics.median(times), 'mean':statistics.mean(times), 'number':number, 'repeat':repeat}
+
+def genotype(depth:int) -> Genotype:
+    return Genotype.random_genotype_m1(4, 0, depth, 4, 3)
+
+def environment(population:int) -> pa.Environment:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return pc.build_environment(population, SEED)
+
+
+@benchmark('depth', number = 1000)
+def genotype_call(depth:int) -> tuple:
+    '''one gate-by-gate evaluation of the active circuit for a single input vector'''
+    g, traits = genotype(depth), [1, 0, 1, 1]
+    return lambda _: g(*traits), None
+
+@benchmark('depth', number = 1000)
+def genotype_traverse(depth:int) -> tuple:
+    g = genotype(depth)
+    for i in g.kwargs['inputs']:
+        i.set_value(1)
+
+    return lambda _: g.traverse(), None
+
+@benchmark('depth')
+def genotype_compile(depth:int) -> tuple:
+    '''truth table and decisions of every input vector from scratch (plan rebuilt), as after a mutation'''
+    g = genotype(depth)
+    def run(_:None) -> None:
+        g.invalidate()
+        g.compile()
+
+    return run, None
+
+@benchmark('depth')
+def genotype_complexity(depth:int) -> tuple:
+    '''g_complexity after the caches were dropped, as after an arbitrary edit of the gates'''
+    g = genotype(depth)
+    def run(_:None) -> None:
+        g.invalidate(complexity = True)
+        Genotype.g_complexity(g)
+
+    return run, None
+
+@benchmark('depth')
+def genotype_parents_and_levels(depth:int) -> tuple:
+    g = genotype(depth)
+    def run(_:None) -> None:
+        g.invalidate()
+        Genotype.parents_and_levels(g)
+
+    return run, None
+
+def mutation_benchmark(method:str, choice:int) -> typing.Callable:
+    def f(depth:int) -> tuple:
+        g = genotype(depth)
+        g.compile()
+        return lambda state: getattr(state, method)(choice), lambda: copy.deepcopy(g)
+
+    return f
+
+for method in ['mutate', 'mutate_v2']:
+    for choice, operator in enumerate(['activate', 'deactivate', 'rewire', 'update'], 1):
+        #mutate's operators are named after the same choice numbers as mutate_v2's
+        benchmark('depth', name = f'genotype_{method}_{operator}')(mutation_benchmark(method, choice))
+
+@benchmark('depth', number = 1000)
+def actor_min_circuit_complexity(depth:int) -> tuple:
+    '''Actor.complexity(min_circuit = True) of an actor that has not met anyone, truth table included'''
+    actor = pa.Protestor(pa.Environment())
+    actor.genotype = genotype(depth)
+    def run(_:None) -> None:
+        actor.genotype.invalidate()
+        actor.complexity(min_circuit = True)
+
+    return run, None
+
+@benchmark('population', number = 1, repeat = 3)
+def environment_spawn(population:int) -> tuple:
+    '''one agent's population built with Environment.spawn'''
+    env = pa.Environment()
+    return lambda _: env.spawn(pa.Protestor, population), None
+
+@benchmark('population', number = 1, repeat = 3)
+def environment_run_interactions(population:int) -> tuple:
+    env = environment(population)
+    def run(_:None) -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            env.run_interactions()
+
+    return run, None
+
+@benchmark('population', number = 1, repeat = 3)
+def environment_reproduction(population:int) -> tuple:
+    '''fitness-proportionate reproduction of all agents, each round starts from freshly scored populations'''
+    env = environment(population)
+    def prepare() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            env.run_interactions()
+
+    return lambda _: env.reproduction(), prepare
+
+@benchmark('population', number = 1, repeat = 3)
+def environment_generation(population:int) -> tuple:
+    '''interactions, complexities, reproduction and increment_generation, as in simulate_generation'''
+    env = environment(population)
+    def run(_:None) -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            env.run_interactions()
+
+        env.compute_complexities()
+        env.reproduction()
+        env.increment_generation()
+
+    return run, None
+
+
+def commit() -> typing.Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True, check = True,
+            cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(grids:dict, name_filter:str = '', log:typing.Callable = print) -> dict:
+    results = []
+    for name, spec in BENCHMARKS.items():
+        if name_filter not in name:
+            continue
+
+        for value in grids[spec['grid']]:
+            seed_all(SEED)
+            run, prepare = spec['f'](value)
+            result = {'name':name, 'params':{spec['grid']:value}, **measure(run, prepare, spec['number'], spec['repeat'])}
+            log(f"{name:<40}{spec['grid']:>12} {value:<6}{result['median']*1e3:>12.4f} ms")
+            results.append(result)
+
+    return {'meta':{'commit':commit(), 'timestamp':time.time(), 'seed':SEED, 'python':platform.python_version(),
+        'numpy':np.__version__, 'platform':platform.platform(), 'grids':grids}, 'results':results}
+
+def compare(old_path:str, new_path:str) -> str:
+    '''median time of every benchmark present in both files, and new/old (< 1 is faster)'''
+    with open(old_path) as f_old, open(new_path) as f_new:
+        old, new = json.load(f_old), json.load(f_new)
+
+    key = lambda r: (r['name'], json.dumps(r['params'], sort_keys = True))
+    old_results = {key(i):i for i in old['results']}
+    rows = [f"{'benchmark':<40}{'params':>20}{'old ms':>12}{'new ms':>12}{'ratio':>8}"]
+    for i in new['results']:
+        if (j:=old_results.get(key(i))) is not None:
+            params = ','.join(f'{a}={b}' for a, b in i['params'].items())
+            rows.append(f"{i['name']:<40}{params:>20}{j['median']*1e3:>12.4f}{i['median']*1e3:>12.4f}{i['median']/j['median']:>8.2f}")
+
+    return '\n'.join(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'ProtestGP benchmarks')
+    parser.add_argument('--quick', action = 'store_true', help = f'small grid: {QUICK}')
+    parser.add_argument('--depths', type = int, nargs = '+', default = None)
+    parser.add_argument('--populations', type = int, nargs = '+', default = None)
+    parser.add_argument('--filter', default = '', help = 'only benchmarks whose name contains this')
+    parser.add_argument('--output', default = None, help = 'default: benchmarks_<commit>.json')
+    parser.add_argument('--compare', nargs = 2, default = None, metavar = ('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        print(compare(*args.compare))
+        sys.exit()
+
+    grids = {'depth':DEPTHS, 'population':POPULATIONS} if not args.quick else {**QUICK}
+    grids['depth'] = args.depths or grids['depth']
+    grids['population'] = args.populations or grids['population']
+    report = run_benchmarks(grids, args.filter)
+    with open(path:=(args.output or f"benchmarks_{report['meta']['commit'] or 'local'}.json"), 'w') as f:
+        json.dump(report, f, indent = 4)
+
+    print(f'written to {path}')
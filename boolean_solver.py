@@ -1,4 +1,4 @@
-import collections, typing, copy
+import collections, typing, copy, functools
 import itertools
 
 class operators:
@@ -464,7 +464,149 @@ def ListToObj(inp:typing.List[list]) -> typing.Any:
         or_container.append(operators.AND(*and_cont))
 
     return operators.OR(*or_container)
-                
+
+
+'''
+bitset two-level minimizer (Quine-McCluskey)
+    - a function of n variables is given by its minterms, integers whose bit n-1-i is variable i
+      (the itertools.product order of the traits, see Genotype.trait_index)
+    - a cube is (value, mask): the bits in mask are eliminated, the other bits of value are the fixed literals
+    - results use the (negated, variable) literals of M.toList, so SOP forms can be passed to ListToObj
+'''
+def bits(x:int) -> typing.Iterator[int]:
+    while x:
+        yield (low:=x & -x).bit_length() - 1
+        x ^= low
+
+@functools.lru_cache
+def clear_bit_words(n:int) -> typing.List[int]:
+    '''clear_bit_words(n)[i]: bitset of the minterms whose bit i is 0'''
+    return [functools.reduce(int.__or__, [1 << v for v in range(2**n) if not v >> i & 1], 0) for i in range(n)]
+
+def prime_implicants(terms:typing.Iterable[int], n:int) -> typing.List[tuple]:
+    '''
+    all prime implicants, sorted by (mask, value)
+        inside[m] is the bitset of the values v (with the bits of m cleared) whose cube (v, m) only holds terms,
+        built from inside[m without its lowest bit] with one shift per mask, a cube is prime when no single-bit extension is inside
+    '''
+    zero = clear_bit_words(n)
+    inside = [functools.reduce(int.__or__, [1 << t for t in terms], 0)]
+    for m in range(1, 2**n):
+        i = (m & -m).bit_length() - 1
+        inside.append((prev:=inside[m ^ 1 << i]) & prev >> (1 << i) & zero[i])
+
+    primes = []
+    for m, word in enumerate(inside):
+        if word:
+            extended = 0
+            for i in range(n):
+                if not m >> i & 1 and (wider:=inside[m | 1 << i]):
+                    extended |= wider | wider << (1 << i)
+
+            primes.extend((v, m) for v in bits(word & ~extended))
+
+    return primes
+
+def cube_terms(cube:tuple) -> int:
+    '''bitset of the minterms inside the cube'''
+    value, mask, result, sub = *cube, 0, cube[1]
+    while True:
+        result |= 1 << (value | sub)
+        if not sub:
+            return result
+
+        sub = (sub - 1) & mask
+
+def select_cover(primes:typing.List[tuple], terms:typing.List[int], n:int, cost:typing.List[int] = None, exact_limit:int = 40) -> typing.List[tuple]:
+    '''
+    cheapest set of primes covering terms, sets of terms are bitsets over the minterm values
+        - @cost: cost of each prime (default: literals + 1), the variables used by the cover are added once each,
+          so for POS clauses with cost = literals + negations the total is form_complexity + 1
+        - essential primes are taken first
+        - the rest is solved by branch and bound on the uncovered term with the fewest covering primes,
+          or greedily (most new terms per cost) when more than exact_limit primes remain
+    '''
+    full = (1 << n) - 1
+    cost = cost or [n - p[1].bit_count() + 1 for p in primes]
+    used = [~p[1] & full for p in primes]
+    target = functools.reduce(int.__or__, [1 << t for t in terms], 0)
+    covers = [cube_terms(p) & target for p in primes]
+    covering = collections.defaultdict(list)
+    for i, c in enumerate(covers):
+        for t in bits(c):
+            covering[t].append(i)
+
+    chosen = sorted({options[0] for options in covering.values() if len(options) == 1})
+    uncovered = target & ~functools.reduce(int.__or__, [covers[i] for i in chosen], 0)
+    if not uncovered:
+        return [primes[i] for i in chosen]
+
+    candidates = sorted({i for t in bits(uncovered) for i in covering[t]})
+    if len(candidates) > exact_limit:
+        while uncovered:
+            best = max(candidates, key = lambda i:((covers[i] & uncovered).bit_count()/cost[i], -i))
+            chosen.append(best)
+            uncovered &= ~covers[best]
+
+        return [primes[i] for i in chosen]
+
+    best = [None, float('inf')]
+    def search(remaining:int, picked:typing.List[int], total:int, variables:int) -> None:
+        if total + variables.bit_count() >= best[1]:
+            return
+
+        if not remaining:
+            best[:] = [[*picked], total + variables.bit_count()]
+            return
+
+        term = min(bits(remaining), key = lambda t:len(covering[t]))
+        for i in sorted(covering[term], key = lambda i:(cost[i], i)):
+            search(remaining & ~covers[i], picked + [i], total + cost[i], variables | used[i])
+
+    search(uncovered, [], sum(cost[i] for i in chosen), functools.reduce(int.__or__, [used[i] for i in chosen], 0))
+    return [primes[i] for i in chosen + best[0]]
+
+def cube_literals(cube:tuple, n:int, form:str = 'sop') -> typing.List[tuple]:
+    '''(negated, variable) literals of a cube, POS clauses negate the variables that are 1 in the maxterm'''
+    value, mask = cube
+    return [(int(bool(value >> (n - 1 - i) & 1) == (form == 'pos')), i) for i in range(n) if not mask >> (n - 1 - i) & 1]
+
+def minimize(minterms:typing.Iterable[int], n:int, dontcares:typing.Iterable[int] = (), form:str = 'sop') -> typing.Union[int, typing.List[list]]:
+    '''
+    minimal two-level form of the function
+        form = 'sop': OR of AND terms, form = 'pos': AND of OR clauses, each a list of (negated, variable) literals
+        constant functions are returned as 0 or 1
+    '''
+    minterms, dontcares = {*minterms}, {*dontcares}
+    if form == 'pos':
+        minterms = {*range(2**n)} - minterms - dontcares
+
+    if not minterms:
+        return int(form == 'pos')
+
+    if len(minterms) + len(dontcares) == 2**n:
+        return int(form == 'sop')
+
+    primes = prime_implicants(minterms | dontcares, n)
+    cost = None
+    if form == 'pos':
+        #literals + negations, so the cover minimizes form_complexity
+        cost = [n - mask.bit_count() + (value & ~mask).bit_count() for value, mask in primes]
+
+    return [cube_literals(i, n, form) for i in select_cover(primes, sorted(minterms), n, cost)]
+
+def form_complexity(form:typing.Union[int, typing.List[list]]) -> int:
+    '''distinct variables + binary gates + negations of a two-level form, counted like Actor.complexity(min_circuit = True)'''
+    if isinstance(form, int):
+        return 0
+
+    literals = [j for i in form for j in i]
+    return len({i for _, i in literals}) + len(form) - 1 + sum(len(i) - 1 for i in form) + sum(i for i, _ in literals)
+
+def truth_table_complexity(word:int, n:int) -> int:
+    '''minimal POS complexity of the n-input function whose truth table is word (bit t: output for minterm t)'''
+    return form_complexity(minimize([t for t in range(2**n) if word >> t & 1], n, form = 'pos'))
+
 if __name__ == '__main__':
     M = entities.M
     One = entities.One
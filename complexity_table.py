@@ -0,0 +1,82 @@
+'''
+minimal-circuit complexity of every 4-input boolean function, as used by Actor.complexity(min_circuit = True)
+
+a function is identified by its truth table word: bit t is the output for ALL_TRAITS[t] (itertools.product order).
+the 2**16 complexities are built once, offline:
+    python complexity_table.py --workers 8
+and min_circuit_table.npy (one uint8 per function) is memory-mapped at import, falling back to sympy when it is missing.
+functions of other widths are minimized with boolean_solver.truth_table_complexity
+'''
+import concurrent.futures, itertools, argparse
+import numpy as np, os, typing
+import boolean_solver
+
+INPUTS = 4
+ALL_TRAITS = [*itertools.product(*[range(2) for _ in range(INPUTS)])]
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'min_circuit_table.npy')
+
+def pos_complexity(word:int) -> int:
+    '''number of gates plus distinct variables in sympy's minimal product-of-sums form of the function'''
+    from sympy.logic import POSform
+    from sympy import symbols
+    import sympy
+
+    def traverse(expr:sympy, d:dict) -> None:
+        if isinstance(expr, int):
+            return
+
+        if isinstance(expr, sympy.core.symbol.Symbol):
+            d[1].add(str(expr))
+            return
+
+        if isinstance(expr, sympy.logic.boolalg.Not):
+            d[0].append('Not')
+
+        else:
+            d[0].extend([type(expr).__name__ for _ in range(len(expr.args) - 1)])
+
+        for i in expr.args:
+            traverse(i, d)
+
+    minterms = [[*trait] for ind, trait in enumerate(ALL_TRAITS) if word >> ind & 1]
+    expr = POSform([*symbols(f'a:{INPUTS}')], minterms, [])
+    d = {1:set(), 0:[]}
+    traverse(expr, d)
+    return len(d[1]) + len(d[0])
+
+def build_table(workers:typing.Optional[int] = None, path:str = TABLE_PATH) -> np.ndarray:
+    size = 2**len(ALL_TRAITS)
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+        table = np.fromiter(executor.map(pos_complexity, range(size), chunksize = 1024), dtype = np.uint8, count = size)
+
+    with open(tmp:=f'{path}.tmp', 'wb') as f:
+        np.save(f, table)
+
+    os.replace(tmp, path)
+    return table
+
+def load_table(path:str = TABLE_PATH) -> typing.Optional[np.ndarray]:
+    if not os.path.exists(path):
+        return None
+
+    return np.load(path, mmap_mode = 'r')
+
+MIN_CIRCUIT_TABLE = load_table()
+
+def min_circuit_complexity(word:int, inputs:int = INPUTS) -> int:
+    if inputs != INPUTS:
+        return boolean_solver.truth_table_complexity(word, inputs)
+
+    if MIN_CIRCUIT_TABLE is not None:
+        return int(MIN_CIRCUIT_TABLE[word])
+
+    return pos_complexity(word)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'builds the minimal-circuit complexity table')
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--output', default = TABLE_PATH)
+    args = parser.parse_args()
+    table = build_table(args.workers, args.output)
+    print(f'{len(table)} functions, complexity {table.min()}-{table.max()}, written to {args.output}')
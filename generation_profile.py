@@ -0,0 +1,90 @@
+import cProfile, contextlib, json, os, time, tracemalloc, typing
+
+class GenerationProfiler:
+    '''
+    wall-clock time of each phase of each generation, appended to generation_timings_<ext>.ndjson:
+        {"generation":..., "total":seconds, "phases":{"interactions":seconds, ...}, "memory":{"current":bytes, "peak":bytes}}
+        - phases are timed with `with profiler.phase(name):` inside `with profiler.generation(g):`, a phase entered twice adds up
+        - @profile_every: every Nth generation is also run under cProfile, its stats go to profile_<ext>_gen<g>.prof (pstats format)
+        - @trace_memory: traced Python allocations (tracemalloc), current and peak since the previous generation, slows the run down
+    '''
+    def __init__(self, folder:str, file_ext:str, profile_every:int = 0, trace_memory:bool = False) -> None:
+        os.makedirs(folder, exist_ok = True)
+        self.folder, self.file_ext = folder, file_ext
+        self.path = os.path.join(folder, f'generation_timings_{file_ext}.ndjson')
+        self.file = open(self.path, 'a')
+        self.profile_every = profile_every
+        self.trace_memory = trace_memory
+        self.owns_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self.owns_tracing:
+            tracemalloc.start()
+
+        self.phases = None
+        self.totals = {}
+
+    @contextlib.contextmanager
+    def phase(self, name:str) -> typing.Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.phases is not None:
+                self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    @contextlib.contextmanager
+    def generation(self, generation:int) -> typing.Iterator[None]:
+        self.phases = {}
+        profile = cProfile.Profile() if self.profile_every and generation % self.profile_every == 0 else None
+        if profile is not None:
+            profile.enable()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(os.path.join(self.folder, f'profile_{self.file_ext}_gen{generation}.prof'))
+
+            self.record(generation, total)
+
+    def record(self, generation:int, total:float) -> None:
+        record = {'generation':generation, 'total':total, 'phases':self.phases}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            record['memory'] = {'current':current, 'peak':peak}
+            tracemalloc.reset_peak()
+
+        for a, b in [('total', total), *self.phases.items()]:
+            self.totals.setdefault(a, []).append(b)
+
+        self.file.write(json.dumps(record)+'\n')
+        self.file.flush()
+        self.phases = None
+
+    def summary(self) -> str:
+        '''table of the time spent in each phase over the run: total, mean and max per generation, share of the generation time'''
+        if not (totals:=self.totals.get('total')):
+            return 'no generations profiled'
+
+        run = sum(totals)
+        rows = [f"{'phase':<16}{'total s':>10}{'mean ms':>10}{'max ms':>10}{'share':>8}"]
+        for a, b in sorted(self.totals.items(), key = lambda x:(x[0] == 'total', -sum(x[1]))):
+            rows.append(f'{a:<16}{sum(b):>10.3f}{sum(b)/len(b)*1e3:>10.2f}{max(b)*1e3:>10.2f}{sum(b)/run:>8.1%}')
+
+        rows.append(f'{len(totals)} generations, timings in {self.path}')
+        return '\n'.join(rows)
+
+    def close(self) -> str:
+        '''closes the timing file and returns the summary'''
+        if self.owns_tracing:
+            tracemalloc.stop()
+
+        self.file.close()
+        return self.summary()
+
+
+def read_timings(path:str) -> typing.List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.endswith('\n')]
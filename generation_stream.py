@@ -0,0 +1,164 @@
+import json, os, queue, threading, typing
+
+class GenerationWriter:
+    '''
+    appends one NDJSON record per generation to the run's output files from a background thread
+        - run_complexities_<ext>.ndjson: {"generation":..., "complexities":{agent:{"complexity":..., "fitness":...}}}
+        - generation_evolutions_<ext>.ndjson: {"generation":..., "trait_actor_associations":..., "actor_decision_evolutions":...}
+        - the queue is bounded: the simulation only waits on the writer when it is more than `backlog` generations behind
+        - every record is flushed once written, so a crashed run keeps all the generations handed to the writer
+        - @every: downsampling, only every Nth generation is written, or with @aggregate the leafwise mean of each block of N generations
+          (such records also carry "span":[first generation, last generation]); when the run ends, its last completed generation
+          and the final record (write(..., final = True)) are always written as is, the rest of an unfinished block is merged without them
+    '''
+    def __init__(self, folder:str, file_ext:str, backlog:int = 64, every:int = 1, aggregate:bool = False) -> None:
+        os.makedirs(folder, exist_ok = True)
+        self.folder, self.file_ext = folder, file_ext
+        self.paths = {'complexities':os.path.join(folder, f'run_complexities_{file_ext}.ndjson'),
+            'evolutions':os.path.join(folder, f'generation_evolutions_{file_ext}.ndjson')}
+        self.every = every
+        self.aggregate = aggregate
+        self.block = []
+        self.pending = None
+        self.queue = queue.Queue(backlog)
+        self.error = None
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def write(self, generation:int, complexities:typing.Optional[dict], trait_associations:dict, decision_evolutions:dict, final:bool = False) -> None:
+        '''the generation's dicts must not be modified after they are handed over'''
+        if self.error is not None:
+            raise self.error
+
+        self.queue.put(({'generation':generation, 'complexities':complexities, 'trait_actor_associations':trait_associations, 
+            'actor_decision_evolutions':decision_evolutions}, final))
+
+    def run(self) -> None:
+        with open(self.paths['complexities'], 'a') as c_f, open(self.paths['evolutions'], 'a') as e_f:
+            while (item:=self.queue.get()) is not None:
+                if self.error is None:
+                    try:
+                        self.consume(*item, [c_f, e_f])
+                    except Exception as e:
+                        self.error = e
+
+                self.queue.task_done()
+
+    def consume(self, record:dict, final:bool, files:list) -> None:
+        if not final and self.aggregate and self.every > 1:
+            self.block.append(record)
+            if record['generation'] % self.every == 0:
+                self.emit(self.merge(self.block), files)
+                self.block = []
+
+        elif final:
+            #the last completed generation is kept as is, either the end of an unfinished block or a skipped generation
+            if self.block:
+                if self.block[:-1]:
+                    self.emit(self.merge(self.block[:-1]), files)
+
+                self.emit(self.block[-1], files)
+                self.block = []
+
+            elif self.pending is not None:
+                self.emit(self.pending, files)
+
+            self.pending = None
+            self.emit(record, files)
+
+        elif record['generation'] % self.every == 0:
+            self.pending = None
+            self.emit(record, files)
+
+        else:
+            self.pending = record
+
+    @staticmethod
+    def merge(block:typing.List[dict]) -> dict:
+        '''leafwise mean of a block of records, a value missing from a generation counts as 0'''
+        def add(total:dict, d:dict) -> None:
+            for a, b in d.items():
+                if isinstance(b, dict):
+                    add(total.setdefault(a, {}), b)
+                else:
+                    total[a] = total.get(a, 0) + b
+
+        def scale(total:dict) -> dict:
+            return {a:scale(b) if isinstance(b, dict) else b/len(block) for a, b in total.items()}
+
+        record = {'generation':block[-1]['generation'], 'span':[block[0]['generation'], block[-1]['generation']]}
+        for key in ['complexities', 'trait_actor_associations', 'actor_decision_evolutions']:
+            total = {}
+            for i in block:
+                add(total, i[key] or {})
+
+            record[key] = scale(total)
+
+        return record
+
+    def emit(self, record:dict, files:list) -> None:
+        c_f, e_f = files
+        if record['complexities'] is not None:
+            c_f.write(json.dumps({a:record[a] for a in ['generation', 'span', 'complexities'] if a in record})+'\n')
+            c_f.flush()
+
+        e_f.write(json.dumps({a:b for a, b in record.items() if a != 'complexities'})+'\n')
+        e_f.flush()
+
+    def state(self) -> dict:
+        '''waits until every queued generation is written, returns what GenerationWriter.resume needs to continue the same files'''
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+        return {'folder':self.folder, 'file_ext':self.file_ext, 'every':self.every, 'aggregate':self.aggregate, 'block':[*self.block], 
+            'pending':self.pending}
+
+    @classmethod
+    def resume(cls, state:dict) -> 'GenerationWriter':
+        '''
+        appends to the files of a checkpointed writer, generations written after the checkpoint are written again,
+        and read_run_complexities/read_generation_evolutions keep the last record of a generation
+        '''
+        writer = cls(state['folder'], state['file_ext'], every = state['every'], aggregate = state['aggregate'])
+        writer.block = [*state['block']]
+        writer.pending = state.get('pending')
+        return writer
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def read_records(path:str) -> typing.Iterator[dict]:
+    with open(path) as f:
+        for line in f:
+            #a crash can leave a truncated last line
+            if line.endswith('\n'):
+                yield json.loads(line)
+
+def read_run_complexities(path:str) -> dict:
+    '''{generation:{agent:metrics}}, as in the json.dump of Environment.generation_complexities'''
+    if not path.endswith('.ndjson'):
+        with open(path) as f:
+            return json.load(f)
+
+    return {str(i['generation']):i['complexities'] for i in read_records(path)}
+
+def read_generation_evolutions(path:str) -> dict:
+    '''{'trait_actor_associations':{generation:...}, 'actor_decision_evolutions':{generation:...}}, as written by Environment.plot_complexities'''
+    if not path.endswith('.ndjson'):
+        with open(path) as f:
+            return json.load(f)
+
+    result = {'trait_actor_associations':{}, 'actor_decision_evolutions':{}}
+    for record in read_records(path):
+        for key, val in result.items():
+            val[str(record['generation'])] = record[key]
+
+    return result
+
+def is_output(f_name:str, prefix:str) -> bool:
+    return f_name.startswith(prefix) and f_name.endswith(('.json', '.ndjson'))
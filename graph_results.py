@@ -1,27 +1,27 @@
 import matplotlib.pyplot as plt
 import collections, json, os, math
 import numpy as np, csv
+from generation_stream import read_run_complexities, is_output
 
 def plot_main_complexities(comp_titles, fitness_titles, comp_ax, fit_ax, c_ind, f_ind, folder = 'comp_matrices_mutations', min_y = None, max_y = None):
     results = collections.defaultdict(dict)
     fitness_results = collections.defaultdict(dict)
     for i in os.listdir(folder):
-        if i.endswith('.json') and i.startswith('run_complexities'):
-            with open(os.path.join(folder, i)) as f:
-                data = json.load(f)
-                for generation, actors in data.items():
-                    for actor, metrics in actors.items():
-                        if actor not in results[int(generation)]:
-                            results[int(generation)][actor] = [float(metrics if not isinstance(metrics, dict) else metrics['complexity'])]
+        if is_output(i, 'run_complexities'):
+            data = read_run_complexities(os.path.join(folder, i))
+            for generation, actors in data.items():
+                for actor, metrics in actors.items():
+                    if actor not in results[int(generation)]:
+                        results[int(generation)][actor] = [float(metrics if not isinstance(metrics, dict) else metrics['complexity'])]
+                    else:
+                        results[int(generation)][actor].append(float(metrics if not isinstance(metrics, dict) else metrics['complexity']))
+
+                    if isinstance(metrics, dict):
+                        if actor not in fitness_results[int(generation)]:
+                            fitness_results[int(generation)][actor] = [float(metrics['fitness'])]
                         else:
-                            results[int(generation)][actor].append(float(metrics if not isinstance(metrics, dict) else metrics['complexity']))
-
-                        if isinstance(metrics, dict):
-                            if actor not in fitness_results[int(generation)]:
-                                fitness_results[int(generation)][actor] = [float(metrics['fitness'])]
-                            else:
-                                fitness_results[int(generation)][actor].append(float(metrics['fitness']))
-                        
+                            fitness_results[int(generation)][actor].append(float(metrics['fitness']))
+                    
     final = collections.defaultdict(list)
     for generation, actors in results.items():
         for a, b in actors.items():
@@ -1,12 +1,14 @@
-import random, typing, copy
+import random, typing, copy, functools, gc
 import warnings, networkx as nx
 import matplotlib.pyplot as plt
-from actor_genotype import Genotype, node
+from actor_genotype import Genotype, GenotypeBatch, PackedGenotype, node
+from generation_stream import GenerationWriter, read_run_complexities
+from generation_profile import GenerationProfiler
 import statistics, collections, numpy as np
-import json, datetime, itertools
-from sympy.logic import POSform
-from sympy import symbols
-import sympy
+import json, datetime, itertools, os, zlib, pickle
+import concurrent.futures, contextlib
+from multiprocessing import shared_memory
+from complexity_table import min_circuit_complexity
 
 TRAITS = [
     'a',
@@ -33,75 +35,103 @@ class Actor:
     persuasiveness
     agreeableness
     """
-    def __init__(self, env = None) -> None:
-        self.traits = self.__class__.random_trait()
-        self.genotype = self.build_genotype()
-        self._outputs = {}
-        self.score = 0
-        self.optimal_score = 0
+    #random_genotype_m1(inputs, constants, depth, outputs, levels_back), read by build_genotype and build_genotypes
+    GENOTYPE = (4, 0, 4, 4, 3)
+
+    def __init__(self, env = None, rng:typing.Any = None) -> None:
         self.id = None
         if env is not None:
-            self.id = max([*env.agent_bindings]+[0]) + 1
+            self.id = env.allocate_ids(1)[0]
             env.agent_bindings[self.id] = self
+            if rng is None and env.rng is not None:
+                rng = env.rng.stream('actor', self.id)
+
+        rng = random if rng is None else rng
+        self.traits = self.__class__.random_trait(rng)
+        self.genotype = self.build_genotype(rng)
+        self._outputs = {}
+        self.score = 0
+        self.optimal_score = 0
+        self._shared_genotype = False
 
     def reset(self) -> 'Actor':
         self.genotype = self.build_genotype()
+        self._shared_genotype = False
         self._outputs = {}
         self.score = 0
         self.optimal_score = 0
         return self
 
-    def mutate(self, prob:float = 0.01) -> None:
-        if random.random() >= 1 - prob:
+    def mutate(self, prob:float = 0.01, rng:typing.Any = random) -> None:
+        if rng.random() >= 1 - prob:
             '''
             for ind in random.sample([*range(len(self.traits))], random.randint(1, 2)):
                 self.traits[ind] = int(not self.traits[ind])
             '''
-            ind = random.choice([*range(len(self.traits))])
+            ind = rng.choice([*range(len(self.traits))])
             self.traits[ind] = int(not self.traits[ind])
-            self.genotype.mutate_v2()
+            if self._shared_genotype:
+                self.genotype = copy.deepcopy(self.genotype)
+                self._shared_genotype = False
+
+            self.genotype.mutate_v2(rng = rng)
+
+    def offspring(self) -> 'Actor':
+        '''
+        copy of the actor that shares its parent's genotype (copy-on-write)
+        the genotype is only cloned if mutate fires, traits and _outputs are copied as before
+        '''
+        child = copy.copy(self)
+        child.traits = [*self.traits]
+        child._outputs = {**self._outputs}
+        child._shared_genotype = True
+        return child
 
     def complexity(self, min_circuit:bool = False) -> int:
         if not min_circuit:
             return self.genotype.complexity
 
-        def traverse(expr:sympy, d:dict) -> None:
-            if isinstance(expr, int):
-                return 
-
-            if isinstance(expr, sympy.core.symbol.Symbol):
-                d[1].add(str(expr))
-                return
-            
-            if isinstance(expr, sympy.logic.boolalg.Not):
-                d[0].append('Not')
-            
-            else:
-                d[0].extend([type(expr).__name__ for _ in range(len(expr.args) - 1)])
-            
-            for i in expr.args:
-                traverse(i, d)
-
-        minterms = []
-        for trait in ALL_TRAITS:
+        #truth table word of the actor's decisions, see complexity_table
+        word = 0
+        for ind, trait in enumerate(ALL_TRAITS):
             if trait in self._outputs:
-                if self._outputs[trait]:
-                    minterms.append([*trait])
+                word |= bool(self._outputs[trait]) << ind
             
             else:
-                with self.genotype:
-                    if self.genotype(*trait)[0]:
-                        minterms.append([*trait])
+                word |= (self.genotype.truth_table[0] >> ind & 1) << ind
+
+        return min_circuit_complexity(word, len(TRAITS))
+
+    @classmethod
+    @functools.lru_cache(maxsize = None)
+    def trait_probabilities(cls) -> typing.Tuple[float]:
+        '''probability of each trait being 1, parsed once per class from the "trait: p" lines of its docstring'''
+        return tuple(float(i.split(': ')[1]) for i in filter(None, cls.__doc__.split('\n')) if i.strip().lstrip())
 
-        #print('in here')
-        expr = POSform([*symbols(f'a:{len(TRAITS)}')], minterms, [])
-        d = {1:set(), 0:[]}
-        traverse(expr, d)
-        return len(d[1]) + len(d[0])
+    @classmethod
+    def random_trait(cls, rng:typing.Any = random) -> typing.List[int]:
+        return [int(rng.random() >= 1 - i) for i in cls.trait_probabilities()]
 
     @classmethod
-    def random_trait(cls) -> typing.List[int]:
-        return [int(random.random() >= 1 - float(i.split(': ')[1])) for i in filter(None, cls.__doc__.split('\n')) if i.strip().lstrip()]
+    def random_traits(cls, n:int, rng:np.random.Generator) -> typing.List[typing.List[int]]:
+        '''traits of n actors in one Bernoulli draw, distributed like random_trait'''
+        return (rng.random((n, len(p:=cls.trait_probabilities()))) >= 1 - np.array(p)).astype(int).tolist()
+
+    def build_genotype(self, rng:typing.Any = random) -> typing.Any:
+        #return Genotype.random_genotype(4, 2, 4)
+        #return copy.deepcopy(DEFAULT_GENOTYPE_1())
+        return Genotype.random_genotype_m1(*self.GENOTYPE, rng = rng)
+
+    @classmethod
+    def build_genotypes(cls, actors:typing.List['Actor'], rng:np.random.Generator) -> typing.List[Genotype]:
+        '''
+        genotypes of new actors for Environment.spawn, drawn at once with the GENOTYPE arguments,
+        a class with its own build_genotype gets one build_genotype call per actor (each with a random.Random seeded from @rng)
+        '''
+        if cls.build_genotype is not Actor.build_genotype:
+            return [actor.build_genotype(random.Random(seed)) for actor, seed in zip(actors, rng.integers(2**63, size = len(actors)).tolist())]
+
+        return Genotype.random_genotypes_m1(len(actors), *cls.GENOTYPE, rng = rng)
 
     def __repr__(self) -> str:
         return f'{self.__class__.__name__}({self.traits})'
@@ -249,12 +279,6 @@ class Protestor(Actor):
     d: 0.4
     """
 
-    def build_genotype(self) -> typing.Any:
-        #return Genotype.random_genotype(4, 2, 4)
-        #return copy.deepcopy(DEFAULT_GENOTYPE_1())
-        return Genotype.random_genotype_m1(4, 0, 4, 4, 3)
-    
-
 class Police(Actor):
     """
     a: 0.4
@@ -263,11 +287,6 @@ class Police(Actor):
     d: 0.4
     """
 
-    def build_genotype(self) -> typing.Any:
-        #return Genotype.random_genotype(4, 2, 4)
-        #return copy.deepcopy(DEFAULT_GENOTYPE_1())
-        return Genotype.random_genotype_m1(4, 0, 4, 4, 3)
-
 class CounterProtestor(Actor):
     """
     a: 0.4
@@ -276,11 +295,6 @@ class CounterProtestor(Actor):
     d: 0.4
     """
 
-    def build_genotype(self) -> typing.Any:
-        #return Genotype.random_genotype(4, 2, 4)
-        #return copy.deepcopy(DEFAULT_GENOTYPE_1())
-        return Genotype.random_genotype_m1(4, 0, 4, 4, 3)
-
 
 class Public(Actor):
     """
@@ -290,98 +304,700 @@ class Public(Actor):
     d: 0.8
     """
 
-    def build_genotype(self) -> typing.Any:
-        #return Genotype.random_genotype(4, 2, 4)
-        #return copy.deepcopy(DEFAULT_GENOTYPE_1())
-        return Genotype.random_genotype_m1(4, 0, 4, 4, 3)
+
+class RNGStreams:
+    '''
+    counter-based random streams for a seeded run
+        - every stream is derived from the run seed and a key, e.g. ('mutation', generation, agent name, actor slot)
+        - the draws for one key do not depend on how many other streams were used before it, so any serial, sharded
+          or parallel execution of the same run consumes identical random numbers
+    '''
+    def __init__(self, seed:int) -> None:
+        self.seed = seed
+
+    @staticmethod
+    def spawn_key(key:tuple) -> typing.List[int]:
+        return [zlib.crc32(i.encode()) if isinstance(i, str) else int(i) for i in key]
+
+    def seed_sequence(self, *key) -> np.random.SeedSequence:
+        return np.random.SeedSequence(self.seed, spawn_key = self.spawn_key(key))
+
+    def stream(self, *key) -> random.Random:
+        '''drop-in replacement for the random module'''
+        return random.Random(int(self.seed_sequence(*key).generate_state(1, np.uint64)[0]))
+
+    def generator(self, *key) -> np.random.Generator:
+        return np.random.default_rng(self.seed_sequence(*key))
+
+
+class Census:
+    '''
+    trait and decision counters of one generation
+        - traits[a, t]: number of distinct actor ids of agent a in trait class t (ALL_TRAITS order), clones share their parent's id
+        - decisions[a1, a2, d]: number of decisions d (0: False, 1: True) agent a1's actors made against agent a2's actors
+        - the counters are allocated on first use, for the agents registered in the environment at that point
+    '''
+    def __init__(self, agents:dict) -> None:
+        self.agents = agents
+        self.names = None
+        self.traits = None
+        self.decisions = None
+
+    def allocate(self) -> None:
+        if self.names is None:
+            self.names = [*self.agents]
+            self.index = {a:i for i, a in enumerate(self.names)}
+            self.traits = np.zeros((len(self.names), len(ALL_TRAITS)), dtype = np.int64)
+            self.decisions = np.zeros((len(self.names), len(self.names), 2), dtype = np.int64)
+
+    def count_population(self, a_name:str, trait_indices:np.ndarray, ids:np.ndarray) -> None:
+        self.allocate()
+        classes = np.unique(np.stack([trait_indices, ids]), axis = 1)[0] if len(ids) else trait_indices
+        self.traits[self.index[a_name]] = np.bincount(classes, minlength = len(ALL_TRAITS))
+
+    def tally(self, a1_name:str, a2_name:str, true_count:int, total:int) -> None:
+        self.allocate()
+        self.decisions[self.index[a1_name], self.index[a2_name]] += [total - true_count, true_count]
+
+    def state(self) -> typing.Optional[tuple]:
+        return None if self.names is None else (self.names, self.traits, self.decisions)
+
+    @classmethod
+    def restore(cls, agents:dict, state:typing.Optional[tuple]) -> 'Census':
+        census = cls(agents)
+        if state is not None:
+            census.names, census.traits, census.decisions = state
+            census.index = {a:i for i, a in enumerate(census.names)}
+
+        return census
+
+    def trait_associations(self) -> dict:
+        '''{str(traits):{agent:count}}'''
+        if self.names is None:
+            return {}
+
+        return {str([*ALL_TRAITS[t]]):{a:self.traits[i, t].item() for i, a in enumerate(self.names) if self.traits[i, t]} 
+            for t in np.flatnonzero(self.traits.any(axis = 0)).tolist()}
+
+    def decision_evolutions(self) -> dict:
+        '''{a1:{a2:{decision:count}}}'''
+        if self.names is None:
+            return {}
+
+        result = {}
+        for i, j in zip(*np.nonzero(self.decisions.any(axis = 2))):
+            result.setdefault(self.names[i], {})[self.names[j]] = {bool(d):c for d, c in enumerate(self.decisions[i, j].tolist()) if c}
+
+        return result
+
+
+class EvaluationCache:
+    '''
+    LRU cache of genotype results keyed by Genotype.fingerprint: {'decisions':bool row over ALL_TRAITS, 'complexity':int}
+        - identical genotypes in a population are evaluated once per generation
+        - genotypes carried over unchanged into the next generation are hits
+        - compute_complexities reads the complexities of the genotypes run_interactions just evaluated
+    '''
+    def __init__(self, maxsize:int = 4096) -> None:
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, genotypes:typing.List[Genotype]) -> typing.List[dict]:
+        keys, found, missing = [i.fingerprint for i in genotypes], {}, {}
+        for key, genotype in zip(keys, genotypes):
+            if key in found or key in missing:
+                self.hits += 1
+
+            elif key in self.entries:
+                self.entries.move_to_end(key)
+                found[key] = self.entries[key]
+                self.hits += 1
+
+            else:
+                missing[key] = genotype
+                self.misses += 1
+
+        if missing:
+            #GenotypeBatch reads the node objects of a Genotype, a PackedGenotype gives its decisions from its own compiled words
+            unpacked = {a:b for a, b in missing.items() if not isinstance(b, PackedGenotype)}
+            rows = dict(zip(unpacked, GenotypeBatch([*unpacked.values()]).decisions())) if unpacked else {}
+            for key, genotype in missing.items():
+                row = rows[key] if key in rows else np.array(genotype.decisions, dtype = bool)
+                found[key] = self.entries[key] = {'decisions':row, 'complexity':genotype.complexity}
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last = False)
+
+        return [found[i] for i in keys]
+
+    def decision_matrix(self, genotypes:typing.List[Genotype]) -> np.ndarray:
+        return np.array([i['decisions'] for i in self.lookup(genotypes)], dtype = bool)
+
+    def complexities(self, genotypes:typing.List[Genotype]) -> typing.List[int]:
+        '''Genotype.complexity of every genotype, equal to Actor.complexity()'''
+        return [i['complexity'] for i in self.lookup(genotypes)]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+def edge_scores(d1_all:np.ndarray, t1:np.ndarray, d2_all:np.ndarray, t2:np.ndarray, payoff:tuple, rows:slice, pairwise_limit:int = 16384) -> tuple:
+    '''
+    scores of the agent1 actors in rows against every agent2 actor
+        @d1_all, d2_all: decision matrices of both populations (Agent.decision_matrix)
+        @t1, t2: trait indices of both populations
+        @payoff: (a1 payoff array, a2 payoff array), see Environment.compile_payoffs
+        @pairwise_limit: edges with at most this many actor pairs use the pairwise matrix, larger ones aggregated_edge_scores
+        returns (agent1 scores, agent2 scores over these rows only, #True agent1 decisions, #True agent2 decisions)
+    '''
+    if len(t1[rows])*len(t2) > pairwise_limit:
+        return aggregated_edge_scores(d1_all, t1, d2_all, t2, payoff, rows)
+
+    d1 = d1_all[rows][:, t2]
+    d2 = d2_all[:, t1[rows]].T
+    d1_i, d2_i = d1.astype(int), d2.astype(int)
+    return payoff[0][d1_i, d2_i].sum(axis = 1), payoff[1][d1_i, d2_i].sum(axis = 0), int(d1.sum()), int(d2.sum())
+
+def aggregated_edge_scores(d1_all:np.ndarray, t1:np.ndarray, d2_all:np.ndarray, t2:np.ndarray, payoff:tuple, rows:slice) -> tuple:
+    '''
+    same result as the pairwise edge_scores in O(population x trait classes):
+    a decision only depends on the actor and the opponent's trait class, so each side is scored against a histogram
+    of the other side over (trait class, decision on my class)
+        h2[c1, c2, b]: agent2 actors of class c2 deciding b against class c1, h1[c2, c1, a] likewise for agent1
+    '''
+    d1, t1 = d1_all[rows], t1[rows]
+    classes = d1_all.shape[1]
+    c1, c2 = np.eye(classes, dtype = np.int64)[t1], np.eye(classes, dtype = np.int64)[t2]
+    h2 = np.stack([(~d2_all).T.astype(np.int64) @ c2, d2_all.T.astype(np.int64) @ c2], axis = 2)
+    h1 = np.stack([(~d1).T.astype(np.int64) @ c1, d1.T.astype(np.int64) @ c1], axis = 2)
+    #payoff[0][d1[x, c2]] -> [payoff against b = 0, b = 1], payoff[1].T[d2[y, c1]] -> [payoff for a = 0, a = 1]
+    a1_scores = (h2[t1]*payoff[0][d1.astype(int)]).sum(axis = (1, 2))
+    a2_scores = (h1[t2]*payoff[1].T[d2_all.astype(int)]).sum(axis = (1, 2))
+    n1, n2 = np.bincount(t1, minlength = classes), np.bincount(t2, minlength = classes)
+    return a1_scores, a2_scores, int((d1 @ n2).sum()), int((d2_all @ n1).sum())
+
+
+def pair_scores(d1_all:np.ndarray, t1:np.ndarray, d2_all:np.ndarray, t2:np.ndarray, payoff:tuple, pairs:tuple) -> tuple:
+    '''
+    edge_scores for the meetings chosen by a scheduler
+        @pairs: (x, y) index arrays, agent1 actor x[i] meets agent2 actor y[i]
+    '''
+    x, y = pairs
+    d1, d2 = d1_all[x, t2[y]].astype(int), d2_all[y, t1[x]].astype(int)
+    a1_scores = np.bincount(x, weights = payoff[0][d1, d2], minlength = len(t1)).astype(np.int64)
+    a2_scores = np.bincount(y, weights = payoff[1][d1, d2], minlength = len(t2)).astype(np.int64)
+    return a1_scores, a2_scores, int(d1.sum()), int(d2.sum())
+
+
+def draw_integers(rng:typing.Any, high:int, size:typing.Any) -> np.ndarray:
+    '''integers in [0, high) from either a np.random.Generator or the legacy np.random module'''
+    return rng.integers(high, size = size) if isinstance(rng, np.random.Generator) else rng.randint(high, size = size)
+
+def selection_probabilities(scores:np.ndarray) -> typing.Optional[np.ndarray]:
+    '''fitness-proportionate probabilities, negative scores are shifted up so the lowest is 0, None when they cannot be normalised'''
+    weights = scores - min(scores.min(), 0)
+    if not np.isfinite(total:=weights.sum()) or total <= 0:
+        return None
+
+    return weights/total
+
+def uniform_selection(scores:np.ndarray, size:int, rng:typing.Any) -> np.ndarray:
+    '''
+    selection schemes: indices of the @size parents drawn from a population with fitness @scores, in one vectorized draw
+    uniform_selection ignores fitness (control runs), the others fall back to it when no parent has a positive shifted score
+    '''
+    return draw_integers(rng, len(scores), size)
+
+def roulette_selection(scores:np.ndarray, size:int, rng:typing.Any) -> np.ndarray:
+    '''fitness-proportionate, @size independent spins (same draws as one rng.choice(p = ...) per offspring)'''
+    if (p:=selection_probabilities(scores)) is None:
+        return uniform_selection(scores, size, rng)
+
+    return rng.choice(len(scores), size = size, p = p)
+
+def sus_selection(scores:np.ndarray, size:int, rng:typing.Any) -> np.ndarray:
+    '''stochastic universal sampling: fitness-proportionate with @size evenly spaced pointers, parents are shuffled into slots'''
+    if (p:=selection_probabilities(scores)) is None:
+        return uniform_selection(scores, size, rng)
+
+    cdf = np.cumsum(p)
+    pointers = (rng.random() + np.arange(size))/size*cdf[-1]
+    return rng.permutation(np.minimum(np.searchsorted(cdf, pointers, side = 'right'), len(scores) - 1))
+
+def tournament_selection(scores:np.ndarray, size:int, rng:typing.Any, k:int = 2) -> np.ndarray:
+    '''each parent is the fittest of @k actors drawn uniformly with replacement, ties go to the first drawn'''
+    contenders = draw_integers(rng, len(scores), (size, k))
+    return contenders[np.arange(size), scores[contenders].argmax(axis = 1)]
+
+def rank_selection(scores:np.ndarray, size:int, rng:typing.Any, pressure:float = 1.5) -> np.ndarray:
+    '''linear ranking: the fittest actor is @pressure (1-2) times as likely as average, the least fit 2 - @pressure times'''
+    if (n:=len(scores)) == 1:
+        return np.zeros(size, dtype = int)
+
+    ranks = scores.argsort(kind = 'stable').argsort()
+    return rng.choice(n, size = size, p = ((2 - pressure) + 2*(pressure - 1)*ranks/(n - 1))/n)
+
+SELECTION_SCHEMES = {'roulette':roulette_selection, 'sus':sus_selection, 'tournament':tournament_selection, 
+    'rank':rank_selection, 'uniform':uniform_selection}
+
+
+class ExhaustiveScheduler:
+    '''
+    decides which actors of an edge meet, Environment.run_interactions calls pairs(env, a1, a2, n1, n2) for every edge
+        - None: every agent1 actor meets every agent2 actor
+        - (x, y) index arrays: agent1 actor x[i] meets agent2 actor y[i]
+    optimal_score grows by the best payoff per meeting, so fractional_fitness_score stays comparable across schedulers
+    '''
+    def pairs(self, env:'Environment', a1:str, a2:str, n1:int, n2:int) -> typing.Optional[tuple]:
+        return None
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}()'
+
+
+class RandomOpponentScheduler(ExhaustiveScheduler):
+    '''every actor on both sides of an edge picks k opponents uniformly at random (without replacement when possible)'''
+    def __init__(self, k:int = 5) -> None:
+        if k < 1:
+            raise ValueError(f'every actor needs at least one opponent, got k = {k}')
+
+        self.k = k
+
+    def sample(self, rng:typing.Any, n:int, m:int) -> np.ndarray:
+        '''k distinct opponents out of m for each of n actors, O(n*k) time and memory'''
+        if self.k >= m:
+            return np.tile(np.arange(m), n)
+
+        if 2*self.k > m:
+            #most of the row is taken anyway, a permutation per row costs O(m) < O(2k)
+            return np.argsort(rng.random((n, m)), axis = 1)[:, :self.k].ravel()
+
+        #draw with replacement and redraw the rows that repeat an opponent, a row is distinct with probability > (1 - k/m)^k
+        opponents = draw_integers(rng, m, (n, self.k))
+        while len(repeated:=np.flatnonzero((np.diff(np.sort(opponents, axis = 1), axis = 1) == 0).any(axis = 1))):
+            opponents[repeated] = draw_integers(rng, m, (len(repeated), self.k))
+
+        return opponents.ravel()
+
+    def pairs(self, env:'Environment', a1:str, a2:str, n1:int, n2:int) -> typing.Optional[tuple]:
+        rng = np.random if env.rng is None else env.rng.generator('schedule', env.generation, a1, a2)
+        x1, y1 = np.repeat(np.arange(n1), min(self.k, n2)), self.sample(rng, n1, n2)
+        y2, x2 = np.repeat(np.arange(n2), min(self.k, n1)), self.sample(rng, n2, n1)
+        return np.concatenate([x1, x2]), np.concatenate([y1, y2])
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(k={self.k})'
+
+
+class LatticeScheduler(ExhaustiveScheduler):
+    '''
+    both populations sit on the same ring, an actor's position is its population slot scaled to the ring,
+    and every actor meets the 2*radius + 1 nearest opponents around its position (each pair meets once)
+    '''
+    def __init__(self, radius:int = 2) -> None:
+        if radius < 0:
+            raise ValueError(f'radius must be at least 0 (the nearest opponent only), got radius = {radius}')
+
+        self.radius = radius
+
+    def neighbours(self, n:int, m:int) -> tuple:
+        offsets = np.arange(-min(self.radius, (m - 1)//2), min(self.radius, m//2) + 1)
+        centre = np.arange(n)*m//n
+        return np.repeat(np.arange(n), len(offsets)), ((centre[:, None] + offsets) % m).ravel()
+
+    def pairs(self, env:'Environment', a1:str, a2:str, n1:int, n2:int) -> typing.Optional[tuple]:
+        x1, y1 = self.neighbours(n1, n2)
+        y2, x2 = self.neighbours(n2, n1)
+        codes = np.unique(np.concatenate([x1*n2 + y1, x2*n2 + y2]))
+        return codes//n2, codes%n2
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(radius={self.radius})'
+
+
+SHARED_BLOCKS = {}
+
+def shared_edge_scores(block:str, layout:dict, a1:str, a2:str, payoff:tuple, rows:slice) -> tuple:
+    '''worker side of InteractionPool: edge_scores on the decision data published in the shared memory block'''
+    if (memory:=SHARED_BLOCKS.get(block)) is None:
+        for i in SHARED_BLOCKS.values():
+            i.close()
+
+        SHARED_BLOCKS.clear()
+        memory = SHARED_BLOCKS[block] = shared_memory.SharedMemory(name = block)
+
+    view = lambda a: [np.ndarray(shape, dtype, memory.buf, offset) for shape, dtype, offset in layout[a]]
+    return edge_scores(*view(a1), *view(a2), payoff, rows)
+
+
+class InteractionPool:
+    '''
+    shards the scoring of a single run's interaction phase across a persistent process pool
+        - every generation, the decision matrices and trait indices of all populations are copied into one
+          multiprocessing.shared_memory block, so a task is only (edge, row range) and no Actor is ever pickled
+        - each task scores a slice of an edge's agent1 rows, the parent concatenates the agent1 scores and
+          sums the partial agent2 scores and decision counts
+    '''
+    def __init__(self, workers:typing.Optional[int] = None) -> None:
+        self.workers = workers or os.cpu_count()
+        self.executor = None
+        self.memory = None
+
+    def publish(self, decisions:dict, trait_indices:dict) -> dict:
+        '''writes the generation's arrays to the shared block (reallocated when it is too small), returns {agent:[(shape, dtype, offset)]}'''
+        layout, size = {}, 0
+        for a in decisions:
+            layout[a] = []
+            for arr in [decisions[a], trait_indices[a]]:
+                layout[a].append((arr.shape, arr.dtype.str, size))
+                size += -(-arr.nbytes//8)*8
+
+        if self.memory is None or self.memory.size < size:
+            self.release()
+            self.memory = shared_memory.SharedMemory(create = True, size = max(size, 8))
+
+        for a in decisions:
+            for arr, (shape, dtype, offset) in zip([decisions[a], trait_indices[a]], layout[a]):
+                np.ndarray(shape, dtype, self.memory.buf, offset)[...] = arr
+
+        return layout
+
+    def scores(self, edges:typing.List[tuple], decisions:dict, trait_indices:dict) -> dict:
+        '''
+        @edges: [(a1, a2, payoff)]
+        returns {(a1, a2):edge_scores(...) over all rows}
+        '''
+        layout = self.publish(decisions, trait_indices)
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers = self.workers)
+
+        jobs = {}
+        for a1, a2, payoff in edges:
+            bounds = np.linspace(0, n:=len(decisions[a1]), min(self.workers, n) + 1).astype(int).tolist()
+            jobs[(a1, a2)] = [self.executor.submit(shared_edge_scores, self.memory.name, layout, a1, a2, payoff, slice(lo, hi)) 
+                for lo, hi in zip(bounds, bounds[1:])]
+
+        results = {}
+        for edge, futures in jobs.items():
+            parts = [i.result() for i in futures]
+            results[edge] = (np.concatenate([i[0] for i in parts]), sum(i[1] for i in parts), 
+                sum(i[2] for i in parts), sum(i[3] for i in parts))
+
+        return results
+
+    def release(self) -> None:
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+        self.release()
 
 
 class Environment:
-    def __init__(self) -> None:
+    def __init__(self, seed:typing.Optional[int] = None, cache_size:int = 4096, scheduler:typing.Any = None, 
+            selection:typing.Optional[typing.Callable] = None) -> None:
+        '''
+        @seed: when given, all randomness of the run is drawn from RNGStreams(seed), otherwise from the global random and np.random modules
+        @cache_size: number of distinct genotypes whose evaluation is kept (EvaluationCache)
+        @scheduler: which actors meet in run_interactions, ExhaustiveScheduler (all pairs) by default
+        @selection: parent selection scheme of reproduction (see SELECTION_SCHEMES), roulette_selection by default
+        '''
+        self.seed = seed
+        self.rng = None if seed is None else RNGStreams(seed)
         self.agents = {}
         self.agent_bindings = {}
         self.interactions = {}
+        self.payoffs = {}
         self.generation = 1
         self.generation_complexities = {}
-        self.trait_actor_associations = {self.generation:collections.defaultdict(dict)}
-        self.actor_decision_evolutions = {self.generation:collections.defaultdict(dict)}
+        self.census = {self.generation:Census(self.agents)}
+        self.interaction_pool = None
+        self.writer = None
+        self.history = None
+        self.profiler = None
+        self.last_id = 0
+        self.evaluations = EvaluationCache(cache_size)
+        self.scheduler = ExhaustiveScheduler() if scheduler is None else scheduler
+        self.selection = roulette_selection if selection is None else selection
 
-    def activate(self, outputs:typing.List[int]) -> int:
-        '''majority voting'''
-        return max(collections.Counter(outputs).items(), key=lambda x:x[1])[0]
+    def allocate_ids(self, n:int) -> range:
+        '''n new actor ids, ids are never reused'''
+        self.last_id += n
+        return range(self.last_id - n + 1, self.last_id + 1)
 
-    def update_trait_associations(self, a_name:str, a_traits:typing.List[int], a_id:int) -> None:
-        if a_name not in self.trait_actor_associations[self.generation][str(a_traits)]:
-            self.trait_actor_associations[self.generation][str(a_traits)][a_name] = set()
+    def spawn(self, cls:typing.Type[Actor], n:int) -> typing.List[Actor]:
+        '''
+        n new actors of class cls, equivalent to [cls(env) for _ in range(n)] but built in bulk
+            - traits and genotypes of all n actors come from one np.random.Generator: in a seeded run keyed by ('spawn', cls, first id),
+              otherwise seeded from np.random, so np.random.seed makes unseeded runs repeatable
+            - garbage collection is paused while the actors are built
+        '''
+        ids = self.allocate_ids(n)
+        rng = np.random.default_rng(np.random.randint(2**63)) if self.rng is None else self.rng.generator('spawn', cls.__name__, ids.start)
+        collecting, actors = gc.isenabled(), []
+        gc.disable()
+        try:
+            for a_id, traits in zip(ids, cls.random_traits(n, rng)):
+                actor = cls.__new__(cls)
+                actor.id, actor.traits = a_id, traits
+                actor._outputs, actor.score, actor.optimal_score, actor._shared_genotype = {}, 0, 0, False
+                self.agent_bindings[a_id] = actor
+                actors.append(actor)
 
-        self.trait_actor_associations[self.generation][str(a_traits)][a_name].add(a_id)
+            for actor, genotype in zip(actors, cls.build_genotypes(actors, rng)):
+                actor.genotype = genotype
+        
+        finally:
+            if collecting:
+                gc.enable()
 
-    def update_actor_evolutions(self, a1_name:str, a2_name:str, a2_traits:typing.List[int], a1_decision:int, a1_payout:int, a1_optimal:int) -> None:
-        if a1_name not in self.actor_decision_evolutions[self.generation]:
-            self.actor_decision_evolutions[self.generation][a1_name] = collections.defaultdict(dict)
+        return actors
+
+    def activate(self, outputs:typing.List[int]) -> int:
+        '''majority voting'''
+        return Genotype.activate(outputs)
 
+    @staticmethod
+    def compile_payoffs(payoff_matrix:typing.List[typing.List[tuple]]) -> dict:
         '''
-        if str(a2_traits) not in self.actor_decision_evolutions[self.generation][a1_name]:
-            self.actor_decision_evolutions[self.generation][a1_name][str(a2_traits)] = collections.defaultdict(int)
-        
-        self.actor_decision_evolutions[self.generation][a1_name][str(a2_traits)][str([a1_decision, a1_payout, a1_optimal])] += 1
+        payoff_matrix[a1_decision][a2_decision] = (a1_payout, a2_payout), split into one array per side
+        plus the best payout either side could receive (used for optimal_score)
         '''
-        if a2_name not in self.actor_decision_evolutions[self.generation][a1_name]:
-            self.actor_decision_evolutions[self.generation][a1_name][a2_name] = collections.defaultdict(int)
+        matrix = np.array(payoff_matrix)
+        return {'a1':matrix[..., 0], 'a2':matrix[..., 1], 'optimal':(matrix[..., 0].max().item(), matrix[..., 1].max().item())}
+
+    @property
+    def trait_actor_associations(self) -> dict:
+        '''{generation:{str(traits):{agent:number of distinct actor ids}}}'''
+        return {a:b.trait_associations() for a, b in self.census.items()}
 
-        self.actor_decision_evolutions[self.generation][a1_name][a2_name][a1_decision] += 1
+    @property
+    def actor_decision_evolutions(self) -> dict:
+        '''{generation:{a1:{a2:{decision:count}}}}'''
+        return {a:b.decision_evolutions() for a, b in self.census.items()}
 
     def run_interactions(self) -> None:
         print('-'*40)
-        matrix_cache = {}
-        for (a1, a2), [agent1, agent2, matrix] in self.interactions.items():
-            for actor1 in agent1.population:
-                self.update_trait_associations(a1, actor1.traits, actor1.id)
-                for actor2 in agent2.population:
-                    self.update_trait_associations(a2, actor2.traits, actor2.id)
-                    a1_decision = self.activate(actor1.genotype(*actor2.traits))
-                    a2_decision = self.activate(actor2.genotype(*actor1.traits))
-                    actor1._outputs[tuple(actor2.traits)] = a1_decision
-                    actor2._outputs[tuple(actor1.traits)] = a2_decision
-                    a1_payout, a2_payout = matrix[a1_decision][a2_decision]
-                    actor1.score += a1_payout
-                    actor2.score += a2_payout
-                    if (s_c:=str(matrix)) not in matrix_cache:
-                        matrix_cache[s_c] = (max(a for row in matrix for a, _ in row), max(b for row in matrix for _, b in row))
-                    
-                    a_opt, b_opt = matrix_cache[s_c]
-                    actor1.optimal_score += a_opt
-                    actor2.optimal_score += b_opt
-
-                    self.update_actor_evolutions(a1, a2, actor2.traits, a1_decision, a1_payout, a_opt)
-                    self.update_actor_evolutions(a2, a1, actor1.traits, a2_decision, a2_payout, b_opt)
-                    '''
-                    if (k:=str((a1, a2))) not in self.generation_population_details[self.generation]:
-                        self.generation_population_details[self.generation][k] = []
-                
-                    self.generation_population_details[self.generation][k].append({
-                        a1:{
-                            'id':actor1.id,
-                            'traits':actor1.traits,
-                            'decision':a1_decision,
-                            'payout':a1_payout,
-                            'optimal_payout':a_opt
-                        },
-                        a2:{
-                            'id':actor2.id,
-                            'traits':actor2.traits,
-                            'decision':a2_decision,
-                            'payout':a2_payout,
-                            'optimal_payout':b_opt
-                        }
-                    })
-                    '''
-                    #print('score after', [actor1.score, actor2.score])
+        decisions = {a:b.decision_matrix() for a, b in self.agents.items()}
+        trait_indices = {a:np.array([Genotype.trait_index(i.traits) for i in b.population], dtype = int) for a, b in self.agents.items()}
+        edges = [(a1, a2, (self.payoffs[(a1, a2)]['a1'], self.payoffs[(a1, a2)]['a2'])) 
+            for (a1, a2), [agent1, agent2, _] in self.interactions.items() if agent1.population and agent2.population]
+        meetings = {(a1, a2):self.scheduler.pairs(self, a1, a2, len(decisions[a1]), len(decisions[a2])) for a1, a2, _ in edges}
+        exhaustive = [i for i in edges if meetings[i[:2]] is None]
+        if self.interaction_pool is None:
+            scores = {(a1, a2):edge_scores(decisions[a1], trait_indices[a1], decisions[a2], trait_indices[a2], payoff, slice(None)) 
+                for a1, a2, payoff in exhaustive}
+        else:
+            scores = self.interaction_pool.scores(exhaustive, decisions, trait_indices)
+
+        for a1, a2, payoff in edges:
+            if (pairs:=meetings[(a1, a2)]) is not None:
+                scores[(a1, a2)] = pair_scores(decisions[a1], trait_indices[a1], decisions[a2], trait_indices[a2], payoff, pairs)
+
+        census = self.census[self.generation]
+        counted = set()
+        for (a1, a2), [agent1, agent2, _] in self.interactions.items():
+            #as before, an agent2 is only counted once it meets a non-empty agent1
+            for a_name, agent in [(a1, agent1)] + ([(a2, agent2)] if agent1.population and agent2.population else []):
+                if a_name not in counted:
+                    counted.add(a_name)
+                    census.count_population(a_name, trait_indices[a_name], np.array([-1 if i.id is None else i.id for i in agent.population], dtype = int))
+
+            if not agent1.population or not agent2.population:
+                continue
+
+            a1_scores, a2_scores, a1_true, a2_true = scores[(a1, a2)]
+            a_opt, b_opt = self.payoffs[(a1, a2)]['optimal']
+            if (pairs:=meetings[(a1, a2)]) is None:
+                a1_meetings, a2_meetings = [len(agent2.population)]*len(agent1.population), [len(agent1.population)]*len(agent2.population)
+                total = len(agent1.population)*len(agent2.population)
+                a1_opponents = {tuple(i.traits):j for i, j in zip(agent2.population, trait_indices[a2].tolist())}
+                a2_opponents = {tuple(i.traits):j for i, j in zip(agent1.population, trait_indices[a1].tolist())}
+                for actor1, row in zip(agent1.population, decisions[a1].tolist()):
+                    for trait, ind in a1_opponents.items():
+                        actor1._outputs[trait] = row[ind]
+
+                for actor2, row in zip(agent2.population, decisions[a2].tolist()):
+                    for trait, ind in a2_opponents.items():
+                        actor2._outputs[trait] = row[ind]
+
+            else:
+                x, y = pairs
+                a1_meetings = np.bincount(x, minlength = len(agent1.population)).tolist()
+                a2_meetings = np.bincount(y, minlength = len(agent2.population)).tolist()
+                total = len(x)
+                d1, d2 = decisions[a1][x, trait_indices[a2][y]].tolist(), decisions[a2][y, trait_indices[a1][x]].tolist()
+                for i, j, o1, o2 in zip(x.tolist(), y.tolist(), d1, d2):
+                    agent1.population[i]._outputs[tuple(agent2.population[j].traits)] = o1
+                    agent2.population[j]._outputs[tuple(agent1.population[i].traits)] = o2
+
+            for actor1, score, count in zip(agent1.population, a1_scores.tolist(), a1_meetings):
+                actor1.score += score
+                actor1.optimal_score += a_opt*count
+
+            for actor2, score, count in zip(agent2.population, a2_scores.tolist(), a2_meetings):
+                actor2.score += score
+                actor2.optimal_score += b_opt*count
+
+            census.tally(a1, a2, a1_true, total)
+            census.tally(a2, a1, a2_true, total)
+
+    def shard_interactions(self, workers:typing.Optional[int] = None) -> 'Environment':
+        '''scores run_interactions on a persistent pool of worker processes, see InteractionPool'''
+        self.unshard_interactions()
+        self.interaction_pool = InteractionPool(workers)
+        return self
+
+    def unshard_interactions(self) -> None:
+        if self.interaction_pool is not None:
+            self.interaction_pool.close()
+            self.interaction_pool = None
+
+    def stream_output(self, proc:int, folder:str = '.', every:int = 1, aggregate:bool = False) -> 'Environment':
+        '''
+        writes finished generations to NDJSON files as the run goes (see GenerationWriter), instead of one dump at the end
+            @every, aggregate: downsampling of the written generations
+        '''
+        self.writer = GenerationWriter(folder, self.file_ext(proc), every = every, aggregate = aggregate)
+        return self
+
+    def profile_phases(self, proc:int, folder:str = '.', profile_every:int = 0, trace_memory:bool = False) -> 'Environment':
+        '''times every phase of every generation (see GenerationProfiler), optionally with cProfile every Nth generation and tracemalloc'''
+        #named like the streamed output of the same run when there is one
+        file_ext = self.file_ext(proc) if self.writer is None else self.writer.file_ext
+        self.profiler = GenerationProfiler(folder, file_ext, profile_every, trace_memory)
+        return self
+
+    def phase(self, name:str) -> typing.ContextManager:
+        return contextlib.nullcontext() if self.profiler is None else self.profiler.phase(name)
+
+    def timed_generation(self) -> typing.ContextManager:
+        return contextlib.nullcontext() if self.profiler is None else self.profiler.generation(self.generation)
+
+    def retain_history(self, keep:typing.Optional[int]) -> 'Environment':
+        '''
+        bounded-memory mode for long runs: generation_complexities and the census only hold the last `keep` generations,
+        older generations are only kept in the streamed output (stream_output, called first), None keeps everything
+        '''
+        if keep is not None and keep < 1:
+            raise ValueError(f'retain_history keeps at least the generation in progress, got keep = {keep}')
+
+        if keep is not None and self.writer is None:
+            raise ValueError('retain_history spills older generations to the streamed output, call stream_output first')
+
+        self.history = keep
+        return self
+
+    def flush_generation(self, final:bool = False) -> None:
+        if self.writer is not None:
+            census = self.census[self.generation]
+            self.writer.write(self.generation, self.generation_complexities.get(self.generation),
+                census.trait_associations(), census.decision_evolutions(), final)
+
+    def evict_generations(self) -> None:
+        for generation in [i for i in self.census if i <= self.generation - self.history]:
+            del self.census[generation]
+            self.generation_complexities.pop(generation, None)
+
+    def file_ext(self, proc:int) -> str:
+        return f"{proc}_{str(datetime.datetime.now()).replace(' ', 'T').replace('.', '')}"
 
     def increment_generation(self) -> None:
+        self.flush_generation()
         self.generation += 1
-        self.trait_actor_associations[self.generation] = collections.defaultdict(dict)
-        self.actor_decision_evolutions[self.generation] = collections.defaultdict(dict)
+        self.census[self.generation] = Census(self.agents)
+        if self.history is not None:
+            self.evict_generations()
+
+    def checkpoint(self, path:str) -> None:
+        '''
+        saves everything needed to continue the run to path, written atomically (pickle)
+            - populations: class, id, traits, scores and _outputs of every actor, genotypes in PackedGenotype form
+              (stored once per genotype, so offspring sharing a genotype still share it after restore)
+            - generation counter, generation_complexities, census, history setting and the streamed output position
+            - states of the global random and np.random generators (seeded runs also carry their seed, see RNGStreams)
+        the agents, interactions and payoffs are not saved: restore into an environment built the same way
+        '''
+        genotypes, packed = {}, []
+        agents = {}
+        for a_name, agent in self.agents.items():
+            agents[a_name] = []
+            for actor in agent.population:
+                if id(actor.genotype) not in genotypes:
+                    genotypes[id(actor.genotype)] = len(packed)
+                    packed.append(actor.genotype.copy() if isinstance(actor.genotype, PackedGenotype) else actor.genotype.pack())
+
+                agents[a_name].append({'class':actor.__class__.__name__, 'id':actor.id, 'traits':actor.traits, 
+                    'genotype':genotypes[id(actor.genotype)], 'shared':actor._shared_genotype, 'score':actor.score, 
+                    'optimal_score':actor.optimal_score, 'outputs':actor._outputs})
+
+        state = {'generation':self.generation, 'seed':self.seed, 'last_id':self.last_id, 'agents':agents,
+            'sizes':{a:b.size for a, b in self.agents.items()}, 'genotypes':packed,
+            'generation_complexities':self.generation_complexities, 'census':{a:b.state() for a, b in self.census.items()},
+            'history':self.history, 'writer':None if self.writer is None else self.writer.state(),
+            'random':random.getstate(), 'np_random':np.random.get_state()}
+
+        with open(tmp:=f'{path}.tmp', 'wb') as f:
+            pickle.dump(state, f, protocol = pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp, path)
+
+    @staticmethod
+    def read_checkpoint(path:str) -> dict:
+        '''the state saved by checkpoint(path), 'sizes' ({agent:size}) and 'seed' tell which environment to restore it into'''
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def restore(self, path:str) -> 'Environment':
+        '''continues the run saved by checkpoint(path), this environment must have the same agents and population sizes'''
+        state = self.read_checkpoint(path)
+        if set(state['agents']) != set(self.agents):
+            raise ValueError(f"checkpoint was made for agents {sorted(state['agents'])}, this environment has {sorted(self.agents)}")
+
+        if (sizes:=state.get('sizes', {a:len(b) for a, b in state['agents'].items()})) != (own:={a:b.size for a, b in self.agents.items()}):
+            raise ValueError(f'checkpoint was made for population sizes {sizes}, this environment has {own}')
+
+        classes, genotypes = {}, [i.unpack() for i in state['genotypes']]
+        stack = [Actor]
+        while stack:
+            for i in (cls:=stack.pop()).__subclasses__():
+                classes[i.__name__] = i
+                stack.append(i)
+
+        for a_name, population in state['agents'].items():
+            self.agents[a_name].population = []
+            for details in population:
+                actor = classes[details['class']].__new__(classes[details['class']])
+                actor.id, actor.traits, actor.genotype = details['id'], details['traits'], genotypes[details['genotype']]
+                actor._shared_genotype, actor._outputs = details['shared'], details['outputs']
+                actor.score, actor.optimal_score = details['score'], details['optimal_score']
+                self.agents[a_name].population.append(actor)
+
+        #the spawned actors were replaced, clones share their parent's id
+        self.agent_bindings = {i.id:i for agent in self.agents.values() for i in agent.population}
+        self.generation = state['generation']
+        self.last_id = max(self.last_id, state.get('last_id', 0), *self.agent_bindings)
+        self.seed = state['seed']
+        self.rng = None if self.seed is None else RNGStreams(self.seed)
+        self.generation_complexities = state['generation_complexities']
+        self.census = {a:Census.restore(self.agents, b) for a, b in state['census'].items()}
+        self.history = state['history']
+        if self.writer is not None:
+            self.writer.close()
+
+        self.writer = None if state['writer'] is None else GenerationWriter.resume(state['writer'])
+        random.setstate(state['random'])
+        np.random.set_state(state['np_random'])
+        return self
 
     def fitness_score_offsets(self, population:typing.List['Agent']) -> typing.List[float]:
         min_score = min(i.score for i in population)
@@ -392,35 +1008,33 @@ class Environment:
 
     def compute_complexities(self, c_func:typing.Callable = statistics.median) -> None:
         self.generation_complexities[self.generation] = {
-                a:{'complexity':c_func(sorted([i.complexity() for i in b.population])),
+                a:{'complexity':c_func(sorted(self.evaluations.complexities([i.genotype for i in b.population]))),
                     'fitness':c_func(self.fractional_fitness_score(b.population))}
             for a, b in self.agents.items()}
 
-    def reproduction(self, control:bool = False) -> None:
+    def reproduction(self, control:bool = False, mutation_rate:float = 0.01) -> None:
+        '''
+        replaces every population with offspring of parents picked by self.selection (uniform_selection when @control),
+        all parents of a population are drawn at once
+        '''
         for a_name, agent in self.agents.items():
-            min_score = min(i.score for i in agent.population)
-            sum_fitness = sum(i.score + (abs(min_score) if min_score < 0 else 0) for i in agent.population)
-            if not sum_fitness:
-                #return 0, a_name
-                sum_fitness = 1
-
-            #print(a_name, [i.score for i in agent.population])
-            #USE THE SAME SEED FOR RANDOM.CHOICE!!
-            fitness_probability = [(i.score + (abs(min_score) if min_score < 0 else 0))/sum_fitness for i in agent.population]
+            selection, fire = np.random, None
+            if self.rng is not None:
+                #one selection stream per agent, and one mutation draw (plus a private stream when it fires) per offspring slot
+                selection = self.rng.generator('selection', self.generation, a_name)
+                fire = self.rng.generator('mutation', self.generation, a_name).random(agent.size)
+
+            scores = np.array([i.score for i in agent.population], dtype = float)
+            parents = (uniform_selection if control else self.selection)(scores, agent.size, selection)
             new_population = []
-            for _ in range(agent.size):
-                if not control:
-                    try:
-                        parent = copy.deepcopy(agent.population[np.random.choice(agent.size, p = fitness_probability)])
-                    except:
-                        print('got fitness issue', fitness_probability)
-                        print('more error info', min_score, sum_fitness)
-                        print([i.score for i in agent.population])
-                        parent = copy.deepcopy(random.choice(agent.population))
-                else:
-                    parent = copy.deepcopy(random.choice(agent.population))
+            for slot, ind in enumerate(parents.tolist()):
+                parent = agent.population[ind].offspring()
+                if fire is None:
+                    parent.mutate(mutation_rate)
+                
+                elif fire[slot] >= 1 - mutation_rate:
+                    parent.mutate(1, self.rng.stream('mutation', self.generation, a_name, slot))
 
-                parent.mutate()
                 parent.score = 0
                 parent.optimal_score = 0
                 new_population.append(parent)
@@ -429,23 +1043,35 @@ class Environment:
 
         return 1, None
                 
-    def plot_complexities(self, proc:int, cached:bool = False, suppress_plot:bool = False) -> None:
+    def plot_complexities(self, proc:int, cached:bool = False, suppress_plot:bool = False, folder:str = '.') -> None:
+        history = None
         if cached:
-            with open('run_complexities.json') as f:
+            with open(os.path.join(folder, 'run_complexities.json')) as f:
                 self.generation_complexities = json.load(f)
 
+        elif self.writer is not None:
+            #the generation in progress is written too, matching the full dump below
+            self.flush_generation(True)
+            self.writer.close()
+            if self.history is not None:
+                #older generations were evicted, plot what was written
+                history = {int(a):b for a, b in read_run_complexities(self.writer.paths['complexities']).items()}
+
+            self.writer = None
+
         else:
-            file_ext = f"{proc}_{str(datetime.datetime.now()).replace(' ', 'T').replace('.', '')}.json"
-            with open(f"run_complexities_{file_ext}", 'a') as f:
+            file_ext = f"{self.file_ext(proc)}.json"
+            os.makedirs(folder, exist_ok = True)
+            with open(os.path.join(folder, f"run_complexities_{file_ext}"), 'a') as f:
                 json.dump(self.generation_complexities, f)
 
-            with open(f'generation_evolutions_{file_ext}', 'a') as f:
-                json.dump({'trait_actor_associations':{a:{j:{K:len(J) for K, J in k.items()} for j, k in b.items()} for a, b in self.trait_actor_associations.items()}, 'actor_decision_evolutions':self.actor_decision_evolutions}, f)
+            with open(os.path.join(folder, f'generation_evolutions_{file_ext}'), 'a') as f:
+                json.dump({'trait_actor_associations':self.trait_actor_associations, 'actor_decision_evolutions':self.actor_decision_evolutions}, f)
 
         agent_complexities = collections.defaultdict(list)
         agent_fitness = collections.defaultdict(list)
         all_generations = []
-        for generation, agents in self.generation_complexities.items():
+        for generation, agents in (history or self.generation_complexities).items():
             all_generations.append(generation)
             for agent, metrics in agents.items():
                 if not isinstance(metrics, dict):
@@ -490,7 +1116,9 @@ class Environment:
         return self
     
     def __exit__(self, *_) -> None:
+        self.unshard_interactions()
         self.interactions = {}
+        self.payoffs = {}
         self.generation = 1
         for agent in self.agents.values():
             agent.population = [i.reset() for i in agent.population]
@@ -521,9 +1149,17 @@ class Environment:
             def __iter__(self) -> typing.Iterator:
                 yield from self.population
 
+            def decision_matrix(self) -> np.ndarray:
+                '''majority decision of every actor (rows) against every trait vector in ALL_TRAITS (columns)'''
+                if not self.population:
+                    return np.zeros((0, len(ALL_TRAITS)), dtype = bool)
+
+                return _env_self.evaluations.decision_matrix([i.genotype for i in self.population])
+
             def interaction(self, agent:'Agent', payoff_matrix) -> None:
                 self.interactions.append(agent)
                 _env_self.interactions[(self.name, agent.name)] = [self, agent, payoff_matrix]
+                _env_self.payoffs[(self.name, agent.name)] = _env_self.compile_payoffs(payoff_matrix)
                 _env_self.agents[self.name] = self
                 _env_self.agents[agent.name] = agent
                  
@@ -533,8 +1169,30 @@ class Environment:
 
         return Agent(a_func)
 
+def test_random_opponent_scheduler(n:int = 200000, m:int = 200000, k:int = 5) -> None:
+    '''
+    RandomOpponentScheduler.sample must stay O(n*k): an n x m draw here would need n*m*8 bytes (320 GB by default),
+    and every row must hold k distinct opponents spread uniformly over the m
+    '''
+    import tracemalloc
+    tracemalloc.start()
+    opponents = RandomOpponentScheduler(k).sample(np.random.default_rng(0), n, m).reshape(n, k)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < 64*n*k, f'sample used {peak} bytes for {n} x {k} opponents'
+    assert (np.diff(np.sort(opponents, axis = 1), axis = 1) > 0).all()
+    counts = np.bincount(opponents.ravel(), minlength = m)
+    assert abs(counts.mean() - n*k/m) < 1e-9 and counts.std() < 2*np.sqrt(n*k/m)
+    for k_small, m_small in [(3, 4), (4, 7), (1, 2)]:
+        rows = RandomOpponentScheduler(k_small).sample(np.random.default_rng(1), 1000, m_small).reshape(1000, k_small)
+        assert (np.diff(np.sort(rows, axis = 1), axis = 1) > 0).all()
+
+    print('RandomOpponentScheduler.sample', n, 'x', k, 'of', m, 'peak memory', peak)
+
+
 if __name__ == '__main__':
     
+    test_random_opponent_scheduler()
     print('Protestor random trait', Protestor().traits)
     print('Police random trait', Police().traits)
     print('CounterProtestor random trait', CounterProtestor().traits)
@@ -1,66 +1,209 @@
 import protest_actors as pa
+import concurrent.futures, argparse
+import random, numpy as np, typing
 
-env = pa.Environment()
-
-@env.agent
-def Protestors():
-    return {'population': [pa.Protestor(env) for _ in range(50)], 'size':50}
-
-@env.agent
-def Police():
-    return {'population': [pa.Police(env) for _ in range(50)], 'size':50}
-
-@env.agent
-def CounterProtestors():
-    return {'population': [pa.CounterProtestor(env) for _ in range(50)], 'size':50}
-
-@env.agent
-def Public():
-    return {'population': [pa.Public(env) for _ in range(50)], 'size':50}
-
-'''
-Protestors.interaction(Police, [[(1, 0), (0, 1)], [(3, -2), (1, 1)]])
-Protestors.interaction(Public, [[(-3, -3), (-2, 0)], [(1, -2), (3, 3)]])
-Protestors.interaction(CounterProtestors, [[(2, 1), (0, 1)], [(2, -1), (3, 3)]])
-Public.interaction(CounterProtestors, [[(1, -1), (0, -1)], [(-1, 0), (3, 3)]])
-CounterProtestors.interaction(Police, [[(-3, -3), (-1, 1)], [(1, -1), (3, 3)]])
-'''
-'''
-Protestors.interaction(Police, [[(-3, -3), (3, 3)], [(3, 3), (-3, -3)]])
-Protestors.interaction(Public, [[(3, 3), (-3, -3)], [(-3, -3), (3, 3)]])
-Protestors.interaction(CounterProtestors, [[(-3, -3), (3, 3)], [(3, 3), (-3, -3)]])
-Public.interaction(CounterProtestors, [[(3, 3), (-3, -3)], [(-3, -3), (3, 3)]])
-CounterProtestors.interaction(Police, [[(3, 3), (-3, -3)], [(-3, -3), (3, 3)]])
-'''
-
-Protestors.interaction(Police, [[(2, 1), (-1, 2)], [(2, -2), (-1, 2)]])
-Protestors.interaction(Public, [[(-2, -1), (-2, 2)], [(2, -2), (3, 3)]])
-Protestors.interaction(CounterProtestors, [[(1, 1), (-1, 2)], [(2, -1), (2, 1)]])
-Public.interaction(CounterProtestors, [[(2, 1), (0, 1)], [(-1, -1), (-1, 2)]])
-CounterProtestors.interaction(Police, [[(-1, -1), (-1, 1)], [(2, -1), (2, 2)]])
-
-
-def simulate_generation(gen_num:int, control:bool) -> bool:
-    for i in range(gen_num[1]):
-        print(f'generation #{i+1}')
-        env.run_interactions()
-        env.compute_complexities()
-        if not (rep_response:=env.reproduction(control))[0]:
-            print(f'{rep_response[1]} scores converged to 0')
-            break
-
-        env.increment_generation()
+SCHEDULERS = {'exhaustive':lambda k:pa.ExhaustiveScheduler(), 'random':pa.RandomOpponentScheduler, 'lattice':pa.LatticeScheduler}
+
+def build_environment(population:int = 50, seed:int = None, scheduler:typing.Any = None, selection:str = 'roulette') -> pa.Environment:
+    env = pa.Environment(seed, scheduler = scheduler, selection = pa.SELECTION_SCHEMES[selection])
+
+    @env.agent
+    def Protestors():
+        return {'population': env.spawn(pa.Protestor, population), 'size':population}
+
+    @env.agent
+    def Police():
+        return {'population': env.spawn(pa.Police, population), 'size':population}
+
+    @env.agent
+    def CounterProtestors():
+        return {'population': env.spawn(pa.CounterProtestor, population), 'size':population}
+
+    @env.agent
+    def Public():
+        return {'population': env.spawn(pa.Public, population), 'size':population}
+
+    '''
+    Protestors.interaction(Police, [[(1, 0), (0, 1)], [(3, -2), (1, 1)]])
+    Protestors.interaction(Public, [[(-3, -3), (-2, 0)], [(1, -2), (3, 3)]])
+    Protestors.interaction(CounterProtestors, [[(2, 1), (0, 1)], [(2, -1), (3, 3)]])
+    Public.interaction(CounterProtestors, [[(1, -1), (0, -1)], [(-1, 0), (3, 3)]])
+    CounterProtestors.interaction(Police, [[(-3, -3), (-1, 1)], [(1, -1), (3, 3)]])
+    '''
+    '''
+    Protestors.interaction(Police, [[(-3, -3), (3, 3)], [(3, 3), (-3, -3)]])
+    Protestors.interaction(Public, [[(3, 3), (-3, -3)], [(-3, -3), (3, 3)]])
+    Protestors.interaction(CounterProtestors, [[(-3, -3), (3, 3)], [(3, 3), (-3, -3)]])
+    Public.interaction(CounterProtestors, [[(3, 3), (-3, -3)], [(-3, -3), (3, 3)]])
+    CounterProtestors.interaction(Police, [[(3, 3), (-3, -3)], [(-3, -3), (3, 3)]])
+    '''
+
+    Protestors.interaction(Police, [[(2, 1), (-1, 2)], [(2, -2), (-1, 2)]])
+    Protestors.interaction(Public, [[(-2, -1), (-2, 2)], [(2, -2), (3, 3)]])
+    Protestors.interaction(CounterProtestors, [[(1, 1), (-1, 2)], [(2, -1), (2, 1)]])
+    Public.interaction(CounterProtestors, [[(2, 1), (0, 1)], [(-1, -1), (-1, 2)]])
+    CounterProtestors.interaction(Police, [[(-1, -1), (-1, 1)], [(2, -1), (2, 2)]])
+
+    return env
+
+
+def checkpoint_environment(path:str, scheduler:typing.Any = None, selection:str = 'roulette') -> pa.Environment:
+    '''an environment built with the population size and seed of the run saved in the checkpoint at @path, ready for restore'''
+    state = pa.Environment.read_checkpoint(path)
+    if len(sizes:={*state['sizes'].values()}) != 1:
+        raise ValueError(f"build_environment uses one population size for every agent, the checkpoint has {state['sizes']}")
+
+    return build_environment(sizes.pop(), state['seed'], scheduler, selection)
+
+def simulate_generation(gen_num:tuple, control:bool, env:pa.Environment = None, folder:str = '.', suppress_plot:bool = False, stream:bool = True,
+        history:int = None, every:int = 1, aggregate:bool = False, checkpoint:str = None, checkpoint_every:int = 100, resume:str = None,
+        profile:bool = False, profile_every:int = 0, trace_memory:bool = False) -> bool:
+    '''
+    @stream: append each generation to NDJSON output files as it finishes, rather than writing JSON at the end of the run
+    @history: keep only the last `history` generations in memory (requires stream)
+    @every, aggregate: write only every Nth generation, or the mean of every N generations
+    @checkpoint: path of the checkpoint written every `checkpoint_every` generations (Environment.checkpoint)
+    @resume: continue from this checkpoint up to generation gen_num[1], the output settings are taken from the checkpoint
+        (without @env, the environment is built with the checkpoint's population size and seed)
+    @profile: write per-phase timings of every generation and print a summary at the end (Environment.profile_phases),
+        with cProfile stats every `profile_every` generations and tracemalloc memory when `trace_memory`
+    '''
+    if env is None:
+        env = build_environment() if resume is None else checkpoint_environment(resume)
+
+    if resume is not None:
+        env.restore(resume)
+
+    else:
+        if stream:
+            env.stream_output(gen_num[0], folder, every, aggregate)
+
+        env.retain_history(history)
+
+    if profile or profile_every or trace_memory:
+        env.profile_phases(gen_num[0], folder, profile_every, trace_memory)
+
+    try:
+        for i in range(env.generation - 1, gen_num[1]):
+            print(f'generation #{i+1}')
+            with env.timed_generation():
+                with env.phase('interactions'):
+                    env.run_interactions()
+
+                with env.phase('complexities'):
+                    env.compute_complexities()
+
+                with env.phase('reproduction'):
+                    rep_response = env.reproduction(control)
+
+                if not rep_response[0]:
+                    print(f'{rep_response[1]} scores converged to 0')
+                    break
+
+                with env.phase('output'):
+                    env.increment_generation()
+
+                if checkpoint is not None and (i + 1) % checkpoint_every == 0:
+                    with env.phase('checkpoint'):
+                        env.checkpoint(checkpoint)
+
+    except BaseException:
+        #keep every generation finished before the failure
+        if env.writer is not None:
+            env.writer.close()
+
+        if env.profiler is not None:
+            env.profiler.close()
+
+        raise
     
-    env.plot_complexities(gen_num[0])
+    env.plot_complexities(gen_num[0], suppress_plot = suppress_plot, folder = folder)
+    if env.profiler is not None:
+        print(env.profiler.close())
+        env.profiler = None
 
     return True
 
-if __name__ == '__main__':
-    _ = simulate_generation((1, 5000), True)
+def run_replicate(replicate:int, seed:int, generations:int, control:bool, population:int = 50, folder:str = '.', scheduler:typing.Any = None, 
+        selection:str = 'roulette', profile:bool = False) -> tuple:
+    '''
+    one independent run in its own process
+        - the replicate index and seed are part of the output file names, so replicates never collide in @folder
     '''
-    import concurrent.futures
+    random.seed(seed)
+    np.random.seed(seed)
+    simulate_generation((f'{replicate}_seed{seed}', generations), control, build_environment(population, seed, scheduler, selection), folder, True, 
+        profile = profile)
+    return replicate, seed
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers = 5) as executor:
-        _ = executor.map(simulate_generation, [(i, 1000) for i in range(5)])
+def run_ensemble(replicates:int, generations:int, control:bool, seed:int = 0, seeds:list = None, 
+        population:int = 50, folder:str = '.', max_workers:int = None, scheduler:typing.Any = None, 
+        selection:str = 'roulette', profile:bool = False) -> list:
     '''
-    
\ No newline at end of file
+    runs @replicates independent simulations across a process pool
+        - replicate i is seeded with seeds[i] (default: seed + i)
+        - returns [(replicate, seed)] in replicate order
+    '''
+    seeds = [seed + i for i in range(replicates)] if seeds is None else seeds
+    with concurrent.futures.ProcessPoolExecutor(max_workers = max_workers) as executor:
+        return [*executor.map(run_replicate, range(1, replicates + 1), seeds, [generations]*replicates, 
+                    [control]*replicates, [population]*replicates, [folder]*replicates, [scheduler]*replicates, [selection]*replicates, 
+                    [profile]*replicates)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'ProtestGP coevolution runs')
+    parser.add_argument('--generations', type = int, default = 5000)
+    parser.add_argument('--control', type = int, default = 1, help = '1: uniform parent selection, 0: fitness-proportionate')
+    parser.add_argument('--replicates', type = int, default = 1)
+    parser.add_argument('--seed', type = int, default = None, help = 'seed of the first replicate, the others use seed + i')
+    parser.add_argument('--population', type = int, default = 50)
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--shards', type = int, default = 0, help = 'single run only: score interactions on this many worker processes')
+    parser.add_argument('--history', type = int, default = None, help = 'single run only: generations kept in memory, older ones are only on disk')
+    parser.add_argument('--every', type = int, default = 1, help = 'single run only: write every Nth generation')
+    parser.add_argument('--aggregate', type = int, default = 0, help = 'single run only: 1: with --every, write the mean of each block of generations')
+    parser.add_argument('--checkpoint', default = None, help = 'single run only: checkpoint file, rewritten every --checkpoint-every generations')
+    parser.add_argument('--checkpoint-every', type = int, default = 100)
+    parser.add_argument('--resume', default = None, help = 'single run only: continue the run saved in this checkpoint')
+    parser.add_argument('--scheduler', default = 'exhaustive', choices = [*SCHEDULERS], help = 'which actors meet: all pairs, k random opponents or ring neighbours')
+    parser.add_argument('--scheduler-k', type = int, default = 5, help = 'opponents per actor (random) or ring radius (lattice)')
+    parser.add_argument('--selection', default = 'roulette', choices = [*pa.SELECTION_SCHEMES], help = 'parent selection when --control 0')
+    parser.add_argument('--profile', type = int, default = 0, help = '1: write per-phase timings of every generation and print a summary')
+    parser.add_argument('--profile-every', type = int, default = 0, help = 'single run only: cProfile every Nth generation')
+    parser.add_argument('--trace-memory', type = int, default = 0, help = 'single run only: 1: record tracemalloc memory per generation')
+    parser.add_argument('--output', default = '.')
+    args = parser.parse_args()
+    scheduler = SCHEDULERS[args.scheduler](args.scheduler_k)
+
+    if args.replicates == 1:
+        if args.seed is not None:
+            random.seed(args.seed)
+            np.random.seed(args.seed)
+
+        if args.resume is not None:
+            #the population size and seed of a resumed run come from its checkpoint
+            env = checkpoint_environment(args.resume, scheduler, args.selection)
+        else:
+            env = build_environment(args.population, args.seed, scheduler, args.selection)
+
+        if args.shards:
+            env.shard_interactions(args.shards)
+
+        try:
+            _ = simulate_generation((1 if args.seed is None else f'1_seed{args.seed}', args.generations), bool(args.control), env, args.output, 
+                history = args.history, every = args.every, aggregate = bool(args.aggregate), 
+                checkpoint = args.checkpoint, checkpoint_every = args.checkpoint_every, resume = args.resume,
+                profile = bool(args.profile), profile_every = args.profile_every, trace_memory = bool(args.trace_memory))
+        finally:
+            env.unshard_interactions()
+    
+    else:
+        single_run = {'--shards':args.shards, '--history':args.history is not None, '--every':args.every != 1, '--aggregate':args.aggregate, 
+            '--checkpoint':args.checkpoint, '--resume':args.resume, '--profile-every':args.profile_every, '--trace-memory':args.trace_memory}
+        if (ignored:=[a for a, b in single_run.items() if b]):
+            parser.error(f"{', '.join(ignored)} only apply to a single run (--replicates 1)")
+
+        print(run_ensemble(args.replicates, args.generations, bool(args.control), 0 if args.seed is None else args.seed, 
+            population = args.population, folder = args.output, max_workers = args.workers, scheduler = scheduler, 
+            selection = args.selection, profile = bool(args.profile)))